@@ -0,0 +1,74 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial, wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections, connections
+
+ASYNC_METHODS = ('GET', 'HEAD')
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    return ThreadPoolExecutor(max_workers=settings.ASYNC_VIEW_THREADS,
+                              thread_name_prefix='async-views')
+
+
+def run_view(view, request, *args, **kwargs):
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ASYNC_METHODS:
+            return await sync_to_async(view, thread_sensitive=True)(
+                request, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(
+            get_executor(), partial(run_view, view, request, *args, **kwargs))
+    return wrapper
+
+
+def close_stream(response):
+    if not response.closed:
+        response.close()
+    connections.close_all()
+
+
+class StreamingASGIHandler(ASGIHandler):
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=1,
+                                      thread_name_prefix='async-stream')
+        parts = iter(response)
+        response.streaming_content = ()
+
+        async def send_parts(message):
+            if message['type'] == 'http.response.body' and (
+                    'body' not in message):
+                while True:
+                    part = await loop.run_in_executor(
+                        executor, next, parts, None)
+                    if part is None:
+                        break
+                    for chunk, _ in self.chunk_bytes(part):
+                        await send({'type': 'http.response.body',
+                                    'body': chunk, 'more_body': True})
+            await send(message)
+
+        try:
+            await super().send_response(response, send_parts)
+        finally:
+            await loop.run_in_executor(executor, close_stream, response)
+            executor.shutdown(wait=False)
@@ -0,0 +1,120 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+LIST_PARAMS = ('page', 'cursor', 'limit', 'count', 'search', 'ordering')
+VERSION_PREFIX = 'recipes:version'
+
+
+def version_key(name):
+    return f'{VERSION_PREFIX}:{hashlib.md5(name.encode()).hexdigest()}'
+
+
+def version_timeout():
+    return max(settings.RECIPE_CACHE_TIMEOUT, settings.RECIPE_FRAGMENT_TIMEOUT)
+
+
+def get_versions(names):
+    keys = [version_key(name) for name in names]
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, version_timeout())
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(names):
+    version = time.time_ns()
+    cache.set_many(
+        {version_key(name): version for name in names}, version_timeout())
+
+
+def is_cacheable(request):
+    return (request.method == 'GET'
+            and not request.user.is_authenticated
+            and request.accepted_renderer.format == 'json')
+
+
+def hash_key(kind, *parts):
+    return f'recipes:{kind}:{hashlib.md5(repr(parts).encode()).hexdigest()}'
+
+
+def make_key(kind, request, parts, versions):
+    return hash_key(
+        kind, request.get_host(), parts, get_versions(versions))
+
+
+def list_key(request):
+    params = request.query_params
+    tags = sorted(set(params.getlist('tags')))
+    author = params.get('author', '')
+    author = str(int(author)) if author.isdigit() else author
+    versions = [f'tag:{slug}' for slug in tags]
+    if author:
+        versions.append(f'author:{author}')
+    if not versions or params.get('search'):
+        versions.append('all')
+    parts = (tags, author, *(params.get(name) for name in LIST_PARAMS))
+    return make_key('list', request, parts, versions)
+
+
+def detail_key(request, pk):
+    pk = int(pk)
+    return make_key('detail', request, pk, [f'recipe:{pk}'])
+
+
+def cached_response_data(key, get_data):
+    data = cache.get(key)
+    if data is None:
+        data = get_data()
+        cache.set(key, data, settings.RECIPE_CACHE_TIMEOUT)
+    return data
+
+
+def recipe_fragments(request, recipes, serialize):
+    host = request.get_host()
+    versions = get_versions([f'recipe:{recipe.pk}' for recipe in recipes])
+    keys = [hash_key('fragment', host, recipe.pk, version)
+            for recipe, version in zip(recipes, versions)]
+    fragments = cache.get_many(keys)
+    missing = [recipe for recipe, key in zip(recipes, keys)
+               if key not in fragments]
+    if missing:
+        fresh = {
+            key: data for key, data in zip(
+                [key for key in keys if key not in fragments],
+                serialize(missing))
+        }
+        cache.set_many(fresh, settings.RECIPE_FRAGMENT_TIMEOUT)
+        fragments.update(fresh)
+    return [
+        {
+            **fragments[key],
+            'author': {
+                **fragments[key]['author'],
+                'is_subscribed': recipe.author_is_subscribed,
+            },
+            'is_favorited': recipe.is_favorited,
+            'is_in_shopping_cart': recipe.is_in_shopping_cart,
+        }
+        for recipe, key in zip(recipes, keys)
+    ]
+
+
+def invalidate_recipe(recipe, tag_slugs=()):
+    names = ['all', f'author:{recipe.author_id}', f'recipe:{recipe.pk}',
+             *(f'tag:{slug}' for slug in set(tag_slugs))]
+    transaction.on_commit(lambda: bump_versions(names))
+
+
+def invalidate_recipes(recipes):
+    names = {'all'}
+    for pk, author, slug in recipes.values_list('pk', 'author', 'tags__slug'):
+        names.update((f'recipe:{pk}', f'author:{author}'))
+        if slug is not None:
+            names.add(f'tag:{slug}')
+    transaction.on_commit(lambda: bump_versions(names))
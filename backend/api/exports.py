@@ -0,0 +1,105 @@
+import csv
+import json
+import os
+import tempfile
+import zlib
+from itertools import islice
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 50
+CHUNK_SIZE = 64 * 1024
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def shopping_list_txt(items):
+    for item in items:
+        yield f'{item["name"]}: {item["total"]} {item["measurement"]}\n'
+
+
+def shopping_list_csv(items):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for item in items:
+        yield writer.writerow(
+            (item['name'], item['total'], item['measurement']))
+
+
+def shopping_list_json(items):
+    yield '['
+    for number, item in enumerate(items):
+        yield (',' if number else '') + json.dumps({
+            'name': item['name'],
+            'amount': item['total'],
+            'measurement_unit': item['measurement'],
+        }, ensure_ascii=False)
+    yield ']'
+
+
+def pdf_font():
+    path = settings.SHOPPING_LIST_PDF_FONT
+    if not path or not os.path.exists(path):
+        return 'Helvetica'
+    name = os.path.splitext(os.path.basename(path))[0]
+    if name not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(name, path))
+    return name
+
+
+def shopping_list_pdf(items):
+    with tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    ) as file:
+        canvas = Canvas(file, pagesize=A4)
+        font = pdf_font()
+        width, height = A4
+        top = height - PDF_MARGIN
+        line = canvas.beginText(PDF_MARGIN, top)
+        line.setFont(font, PDF_FONT_SIZE)
+        for item in items:
+            if line.getY() < PDF_MARGIN:
+                canvas.drawText(line)
+                canvas.showPage()
+                line = canvas.beginText(PDF_MARGIN, top)
+                line.setFont(font, PDF_FONT_SIZE)
+            line.textLine(
+                f'{item["name"]}: {item["total"]} {item["measurement"]}')
+        canvas.drawText(line)
+        canvas.save()
+        file.seek(0)
+        yield from iter(lambda: file.read(CHUNK_SIZE), b'')
+
+
+def recipes_ndjson(recipes, serialize, chunk_size):
+    recipes = iter(recipes)
+    for chunk in iter(lambda: list(islice(recipes, chunk_size)), []):
+        yield ''.join(
+            json.dumps(recipe, cls=DjangoJSONEncoder,
+                       ensure_ascii=False) + '\n'
+            for recipe in serialize(chunk)
+        ).encode('utf-8')
+
+
+def gzip_stream(chunks):
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+SHOPPING_LIST_WRITERS = {
+    'txt': shopping_list_txt,
+    'csv': shopping_list_csv,
+    'json': shopping_list_json,
+    'pdf': shopping_list_pdf,
+}
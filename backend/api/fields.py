@@ -0,0 +1,74 @@
+import base64
+import binascii
+import io
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile)
+from PIL import Image
+from rest_framework import serializers
+
+IMAGE_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+BASE64_PREFIX = ';base64,'
+BASE64_CHUNK_SIZE = 64 * 1024
+
+
+class RecipeImageField(serializers.ImageField):
+    default_error_messages = {
+        'invalid': 'Передайте картинку файлом или строкой base64.',
+        'invalid_base64': 'Картинка должна быть передана в base64.',
+        'too_large': 'Размер картинки не должен превышать {max_size} МБ.',
+        'too_many_pixels': ('Разрешение картинки не должно превышать '
+                            '{max_pixels} Мп.'),
+        'invalid_image': 'Загрузите корректную картинку в формате '
+                         'JPEG, PNG, GIF или WebP.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = self.decode(data)
+        elif not hasattr(data, 'size'):
+            self.fail('invalid')
+        if data.size > settings.RECIPE_IMAGE_MAX_BYTES:
+            self.fail('too_large', max_size=round(
+                settings.RECIPE_IMAGE_MAX_BYTES / 1024 / 1024, 1))
+        data.name = f'{uuid.uuid4()}.{self.inspect(data)}'
+        return super().to_internal_value(data)
+
+    def decode(self, data):
+        prefix = data.find(BASE64_PREFIX)
+        offset = prefix + len(BASE64_PREFIX) if prefix != -1 else 0
+        size = (len(data) - offset) * 3 // 4 - data[-2:].count('=')
+        if size > settings.RECIPE_IMAGE_MAX_BYTES:
+            self.fail('too_large', max_size=round(
+                settings.RECIPE_IMAGE_MAX_BYTES / 1024 / 1024, 1))
+        if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            file = TemporaryUploadedFile('image', None, size, None)
+        else:
+            file = InMemoryUploadedFile(
+                io.BytesIO(), None, 'image', None, size, None)
+        try:
+            for start in range(offset, len(data), BASE64_CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    data[start:start + BASE64_CHUNK_SIZE], validate=True))
+        except (binascii.Error, ValueError):
+            file.close()
+            self.fail('invalid_base64')
+        file.size = file.tell()
+        file.seek(0)
+        return file
+
+    def inspect(self, file):
+        try:
+            image = Image.open(file)
+        except (OSError, Image.DecompressionBombError):
+            self.fail('invalid_image')
+        if image.format not in IMAGE_EXTENSIONS:
+            self.fail('invalid_image')
+        width, height = image.size
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            self.fail('too_many_pixels', max_pixels=round(
+                settings.RECIPE_IMAGE_MAX_PIXELS / 1000 / 1000, 1))
+        file.seek(0)
+        return IMAGE_EXTENSIONS[image.format]
@@ -1,5 +1,6 @@
 from django_filters.rest_framework import FilterSet, filters
 
+from recipes.fulltext import search
 from recipes.models import Ingredient, Recipe, Tag
 
 
@@ -11,6 +12,15 @@ class IngredientFilter(FilterSet):
         fields = ['name']
 
 
+class RecipeOrderingFilter(filters.OrderingFilter):
+    def filter(self, queryset, value):
+        if not value:
+            return queryset
+        ordering = self.get_ordering_value(value[0])
+        prefix = '-' if ordering.startswith('-') else ''
+        return queryset.order_by(ordering, f'{prefix}pub_date', f'{prefix}id')
+
+
 class RecipeFilter(FilterSet):
     tags = filters.ModelMultipleChoiceFilter(field_name='tags__slug',
                                              to_field_name='slug',
@@ -19,10 +29,14 @@ class RecipeFilter(FilterSet):
         method='get_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart')
+    search = filters.CharFilter(method='get_search')
+    ordering = RecipeOrderingFilter(
+        fields=(('favorites_count', 'popularity'),))
 
     class Meta:
         model = Recipe
-        fields = ('is_favorited', 'author', 'tags', 'is_in_shopping_cart')
+        fields = ('is_favorited', 'author', 'tags', 'is_in_shopping_cart',
+                  'search', 'ordering')
 
     def get_favorited(self, queryset, name, value):
         user = self.request.user
@@ -35,3 +49,6 @@ class RecipeFilter(FilterSet):
         if value and user.is_authenticated:
             return queryset.filter(shopping_cart__user=user)
         return queryset
+
+    def get_search(self, queryset, name, value):
+        return search(queryset, value)
@@ -0,0 +1,274 @@
+import json
+import math
+import random
+import socket
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+PERCENTILES = (50, 95, 99)
+CHUNK_SIZE = 64 * 1024
+REQUEST_TIMEOUT = 30
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = max(0, math.ceil(len(ordered) * percent / 100) - 1)
+    return ordered[index]
+
+
+class InProcessTransport:
+    def __init__(self, token):
+        headers = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        self.client = Client(**headers)
+
+    def request(self, method, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url)
+            content = (b''.join(response.streaming_content)
+                       if response.streaming else response.content)
+        return response.status_code, len(content), len(queries)
+
+    def close(self):
+        connection.close()
+
+
+class HttpTransport:
+    def __init__(self, base_url, token):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        if token:
+            self.session.headers['Authorization'] = f'Token {token}'
+
+    def request(self, method, url):
+        try:
+            response = self.session.request(
+                method, self.base_url + url, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException:
+            return 0, 0, None
+        return response.status_code, len(response.content), None
+
+    def close(self):
+        self.session.close()
+
+
+class Command(BaseCommand):
+    help = ('Run weighted request scenarios against the API and report '
+            'throughput and latency percentiles per route as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url',
+                            help='Benchmark a running server instead of '
+                                 'calling the URLconf in-process')
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Scenarios to run per worker')
+        parser.add_argument('--duration', type=float,
+                            help='Stop each worker after this many seconds')
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument('--users', type=int, default=20,
+                            help='Number of authenticated users to sample')
+        parser.add_argument('--anonymous-share', type=float, default=0.5)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the JSON report here')
+        parser.add_argument('--slow-clients', type=int, default=0,
+                            help='Keep this many connections busy sending '
+                                 'request headers one byte at a time '
+                                 '(requires --base-url)')
+        parser.add_argument('--slow-client-interval', type=float,
+                            default=1.0,
+                            help='Seconds between bytes of a slow client')
+
+    def handle(self, *args, **options):
+        if options['slow_clients'] and not options['base_url']:
+            raise CommandError('--slow-clients работает только с --base-url')
+        self.options = options
+        self.load_fixtures()
+        self.samples = defaultdict(list)
+        self.lock = threading.Lock()
+        stop = threading.Event()
+        slow_clients = [
+            threading.Thread(target=self.slow_client, args=(stop,),
+                             daemon=True)
+            for _ in range(options['slow_clients'])
+        ]
+        for slow_client in slow_clients:
+            slow_client.start()
+        workers = [
+            threading.Thread(target=self.worker, args=(number,))
+            for number in range(options['concurrency'])
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        stop.set()
+        report = self.report(time.perf_counter() - started)
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf8') as file:
+                file.write(output)
+        self.stdout.write(output)
+
+    def load_fixtures(self):
+        rng = random.Random(self.options['seed'])
+        self.recipe_ids = list(
+            Recipe.objects.order_by('id').values_list('id', flat=True))
+        self.tags = list(
+            Tag.objects.order_by('id').values_list('slug', flat=True))
+        self.ingredient_names = list(Ingredient.objects.order_by(
+            'id').values_list('name', flat=True)[:1000])
+        if not self.recipe_ids or not self.ingredient_names:
+            raise CommandError(
+                'Недостаточно данных: запустите generate_fake_data')
+        user_ids = list(User.objects.order_by('id').values_list(
+            'id', flat=True)[:self.options['users'] * 10])
+        self.tokens = [
+            Token.objects.get_or_create(user_id=user_id)[0].key
+            for user_id in sorted(rng.sample(
+                user_ids, min(len(user_ids), self.options['users'])))
+        ]
+        self.pages = max(1, len(self.recipe_ids) // 6)
+
+    def scenarios(self, authenticated):
+        scenarios = [
+            (50, self.browse_recipes),
+            (15, self.view_recipe),
+            (20, self.autocomplete_ingredient),
+        ]
+        if authenticated:
+            scenarios += [
+                (10, self.toggle_favorite),
+                (5, self.download_shopping_cart),
+                (5, self.browse_subscriptions),
+            ]
+        return scenarios
+
+    def worker(self, number):
+        rng = random.Random(self.options['seed'] + number)
+        deadline = (time.perf_counter() + self.options['duration']
+                    if self.options['duration'] else None)
+        tokens = [None]
+        if self.tokens and self.options['anonymous_share'] < 1:
+            tokens.append(rng.choice(self.tokens))
+        transports = {token: self.transport(token) for token in tokens}
+        try:
+            for _ in range(self.options['requests']):
+                if deadline and time.perf_counter() > deadline:
+                    break
+                token = (tokens[0] if len(tokens) == 1 or rng.random()
+                         < self.options['anonymous_share'] else tokens[1])
+                weights, scenarios = zip(*self.scenarios(token is not None))
+                scenario, = rng.choices(scenarios, weights=weights)
+                for route, method, url in scenario(rng):
+                    self.call(transports[token], route, method, url)
+        finally:
+            for transport in transports.values():
+                transport.close()
+
+    def slow_client(self, stop):
+        url = urlsplit(self.options['base_url'])
+        request = (f'GET /api/tags/ HTTP/1.1\r\nHost: {url.hostname}\r\n'
+                   'Connection: close\r\n\r\n').encode()
+        while not stop.is_set():
+            try:
+                with socket.create_connection(
+                    (url.hostname, url.port or 80), timeout=30
+                ) as connection:
+                    for byte in request:
+                        if stop.wait(self.options['slow_client_interval']):
+                            return
+                        connection.sendall(bytes((byte,)))
+                    while connection.recv(CHUNK_SIZE):
+                        pass
+            except OSError:
+                stop.wait(self.options['slow_client_interval'])
+
+    def transport(self, token):
+        if self.options['base_url']:
+            return HttpTransport(self.options['base_url'], token)
+        return InProcessTransport(token)
+
+    def call(self, transport, route, method, url):
+        started = time.perf_counter()
+        status, size, queries = transport.request(method, url)
+        elapsed = (time.perf_counter() - started) * 1000
+        with self.lock:
+            self.samples[route].append((elapsed, status, size, queries))
+
+    def browse_recipes(self, rng):
+        url = f'/api/recipes/?page={min(self.pages, rng.randint(1, 20))}'
+        if self.tags and rng.random() < 0.5:
+            url += ''.join(f'&tags={slug}' for slug in rng.sample(
+                self.tags, rng.randint(1, min(2, len(self.tags)))))
+        yield 'recipes-list', 'get', url
+
+    def view_recipe(self, rng):
+        yield ('recipes-detail', 'get',
+               f'/api/recipes/{rng.choice(self.recipe_ids)}/')
+
+    def autocomplete_ingredient(self, rng):
+        name = rng.choice(self.ingredient_names)
+        for length in range(1, min(4, len(name)) + 1):
+            yield ('ingredients-autocomplete', 'get',
+                   f'/api/ingredients/?name={name[:length]}')
+
+    def toggle_favorite(self, rng):
+        url = f'/api/recipes/{rng.choice(self.recipe_ids)}/favorite/'
+        yield 'recipes-favorite-add', 'post', url
+        yield 'recipes-favorite-remove', 'delete', url
+
+    def download_shopping_cart(self, rng):
+        yield ('recipes-download-shopping-cart', 'get',
+               '/api/recipes/download_shopping_cart/')
+
+    def browse_subscriptions(self, rng):
+        yield ('users-subscriptions', 'get',
+               '/api/users/subscriptions/?recipes_limit=3')
+
+    def report(self, elapsed):
+        routes = {}
+        for route, samples in sorted(self.samples.items()):
+            latencies = [sample[0] for sample in samples]
+            queries = [sample[3] for sample in samples
+                       if sample[3] is not None]
+            routes[route] = {
+                'requests': len(samples),
+                'errors': sum(not sample[1] or sample[1] >= 500
+                              for sample in samples),
+                'statuses': sorted({sample[1] for sample in samples}),
+                'throughput': round(len(samples) / elapsed, 2),
+                'mean_ms': round(sum(latencies) / len(latencies), 2),
+                **{
+                    f'p{percent}_ms': round(
+                        percentile(latencies, percent), 2)
+                    for percent in PERCENTILES
+                },
+                'mean_bytes': round(
+                    sum(sample[2] for sample in samples) / len(samples)),
+                'mean_queries': (round(sum(queries) / len(queries), 2)
+                                 if queries else None),
+                'max_queries': max(queries) if queries else None,
+            }
+        total = sum(route['requests'] for route in routes.values())
+        return {
+            'mode': 'http' if self.options['base_url'] else 'in-process',
+            'database': connection.vendor,
+            'concurrency': self.options['concurrency'],
+            'slow_clients': self.options['slow_clients'],
+            'elapsed_s': round(elapsed, 2),
+            'requests': total,
+            'throughput': round(total / elapsed, 2),
+            'routes': routes,
+        }
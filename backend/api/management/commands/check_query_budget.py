@@ -0,0 +1,165 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (Favorite, FeedEntry, Ingredient,
+                            IngredientInRecipe, Recipe, ShoppingCart,
+                            ShoppingListItem, Tag)
+from users.models import Follow, User
+
+ANONYMOUS = 'anonymous'
+AUTHENTICATED = 'authenticated'
+STAFF = 'staff'
+
+USERS = 20
+RECIPES = 120
+INGREDIENTS_PER_RECIPE = 8
+
+# (endpoint, client, max queries, max milliseconds)
+BUDGETS = (
+    ('/api/recipes/', ANONYMOUS, 5, 300),
+    ('/api/recipes/', AUTHENTICATED, 6, 300),
+    ('/api/recipes/?limit=50', ANONYMOUS, 5, 1000),
+    ('/api/recipes/?limit=50', AUTHENTICATED, 6, 1000),
+    ('/api/recipes/?cursor=&limit=50', ANONYMOUS, 4, 1000),
+    ('/api/recipes/?cursor=&limit=50', AUTHENTICATED, 5, 1000),
+    ('/api/recipes/?tags=budget-0&tags=budget-1', ANONYMOUS, 6, 300),
+    ('/api/recipes/?is_favorited=1', AUTHENTICATED, 6, 300),
+    ('/api/recipes/?ordering=-popularity&limit=50', ANONYMOUS, 5, 1000),
+    ('/api/recipes/{recipe}/', ANONYMOUS, 4, 100),
+    ('/api/recipes/{recipe}/', AUTHENTICATED, 5, 100),
+    ('/api/recipes/feed/?limit=50', AUTHENTICATED, 8, 1000),
+    ('/api/users/subscriptions/?recipes_limit=3', AUTHENTICATED, 4, 300),
+    ('/api/users/subscriptions/?recipes_limit=3&count=none',
+     AUTHENTICATED, 3, 300),
+    ('/api/users/', ANONYMOUS, 2, 300),
+    ('/api/users/', AUTHENTICATED, 3, 300),
+    ('/api/users/?count=none', AUTHENTICATED, 2, 300),
+    ('/api/recipes/download_shopping_cart/', AUTHENTICATED, 2, 300),
+    ('/api/recipes/export/', STAFF, 5, 1000),
+    ('/api/ingredients/?name=budget', ANONYMOUS, 1, 100),
+    ('/api/ingredients/', ANONYMOUS, 2, 300),
+    ('/api/tags/', ANONYMOUS, 2, 100),
+)
+
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+class Command(BaseCommand):
+    help = ('Seed a dataset, call the hot endpoints and check their '
+            'query and time budgets. All changes are rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--time-factor', type=float, default=1.0,
+                            help='Multiply every time budget by this value')
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), override_settings(CACHES=NO_CACHE):
+            context = self.seed()
+            results = [
+                self.measure(context, *budget) for budget in BUDGETS
+            ]
+            transaction.set_rollback(True)
+        failures = self.report(results, options['time_factor'])
+        if failures:
+            raise CommandError(
+                f'Превышен бюджет у {failures} эндпоинтов')
+
+    def seed(self):
+        users = [
+            User.objects.create(username=f'budget-{i}',
+                                email=f'budget-{i}@example.com',
+                                first_name='Бюджет', last_name=str(i))
+            for i in range(USERS)
+        ]
+        tags = [
+            Tag.objects.create(name=f'budget-{i}', color=f'#bdg{i:03}',
+                               slug=f'budget-{i}')
+            for i in range(5)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'budget ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(60)
+        ]
+        recipes = []
+        for i in range(RECIPES):
+            recipe = Recipe.objects.create(
+                name=f'Рецепт {i}', author=users[i % len(users)],
+                image='recipe/budget.png', text='Описание ' * 20,
+                cooking_time=i % 90 + 1)
+            recipe.tags.set(tags[i % 3:i % 3 + 2])
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(
+                    recipe=recipe,
+                    ingredient=ingredients[(i + j) % len(ingredients)],
+                    amount=j + 1)
+                for j in range(INGREDIENTS_PER_RECIPE)
+            )
+            recipes.append(recipe)
+        user = users[0]
+        Favorite.objects.bulk_create(
+            Favorite(user=user, recipe=recipe) for recipe in recipes[::4])
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe=recipe) for recipe in recipes[::4])
+        ShoppingListItem.objects.rebuild([user.id])
+        Follow.objects.bulk_create(
+            Follow(user=user, author=author) for author in users[1:16])
+        FeedEntry.objects.rebuild([user.id])
+        token = Token.objects.create(user=user)
+        staff_token = Token.objects.create(user=User.objects.create(
+            username='budget-staff', email='budget-staff@example.com',
+            is_staff=True))
+        return {
+            ANONYMOUS: Client(),
+            AUTHENTICATED: Client(HTTP_AUTHORIZATION=f'Token {token.key}'),
+            STAFF: Client(HTTP_AUTHORIZATION=f'Token {staff_token.key}'),
+            'recipe': recipes[-1].id,
+        }
+
+    @staticmethod
+    def measure(context, endpoint, client, max_queries, max_ms):
+        url = endpoint.format(recipe=context['recipe'])
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = context[client].get(url)
+            content = (b''.join(response.streaming_content)
+                       if response.streaming else response.content)
+            elapsed = (time.perf_counter() - started) * 1000
+        return {
+            'endpoint': url,
+            'client': client,
+            'status': response.status_code,
+            'queries': len(queries),
+            'max_queries': max_queries,
+            'ms': elapsed,
+            'max_ms': max_ms,
+            'bytes': len(content),
+        }
+
+    def report(self, results, time_factor):
+        row = '{:<55} {:<14} {:>6} {:>11} {:>15} {:>9}'
+        self.stdout.write(row.format(
+            'endpoint', 'client', 'status', 'queries', 'ms', 'bytes'))
+        failures = 0
+        for result in results:
+            max_ms = result['max_ms'] * time_factor
+            failed = (result['status'] != 200
+                      or result['queries'] > result['max_queries']
+                      or result['ms'] > max_ms)
+            failures += failed
+            line = row.format(
+                result['endpoint'], result['client'], result['status'],
+                f'{result["queries"]}/{result["max_queries"]}',
+                f'{result["ms"]:.1f}/{max_ms:.0f}',
+                result['bytes'],
+            )
+            self.stdout.write(
+                self.style.ERROR(line) if failed else line)
+        return failures
@@ -0,0 +1,67 @@
+import gzip
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from recipes.models import ReferenceDataVersion
+
+
+class ReferenceDataMixin:
+    bodies = {}
+
+    def get_version(self):
+        return ReferenceDataVersion.objects.get_version(
+            self.queryset.model._meta.db_table)
+
+    def cache_headers(self, response, etag):
+        response['ETag'] = etag
+        response['Cache-Control'] = (
+            f'public, max-age={settings.REFERENCE_DATA_MAX_AGE}')
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    def conditional(self, request, suffix, render):
+        version = self.get_version()
+        etag = quote_etag(
+            f'{self.queryset.model._meta.db_table}-{version}-{suffix}')
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = render(version)
+        return self.cache_headers(response, etag)
+
+    def list_body(self, version):
+        name = self.queryset.model._meta.db_table
+        cached = self.bodies.get(name)
+        if cached is None or cached[0] != version:
+            body = JSONRenderer().render(
+                self.get_serializer(self.get_queryset(), many=True).data)
+            cached = (version, body, gzip.compress(body))
+            self.bodies[name] = cached
+        return cached[1:]
+
+    def render_list(self, version, compress):
+        body, compressed = self.list_body(version)
+        if compress:
+            response = HttpResponse(
+                compressed, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+            return response
+        return HttpResponse(body, content_type='application/json')
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params or request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        compress = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        return self.conditional(
+            request, 'list-gz' if compress else 'list',
+            lambda version: self.render_list(version, compress))
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return self.conditional(
+            request, instance.pk,
+            lambda version: Response(self.get_serializer(instance).data))
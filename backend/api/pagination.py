@@ -1,6 +1,170 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
+
+from recipes.models import FeedEntry
+from users.models import Follow
+
+from .caching import hash_key
+
+
+class CountFreePaginator(Paginator):
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы должен быть числом')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        items = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not items and number > 1:
+            raise EmptyPage('Страница не содержит результатов')
+        self.count = None
+        self.num_pages = number + (len(items) > self.per_page)
+        return self._get_page(items[:self.per_page], number, self)
+
+
+class ApproximateCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        key = hash_key('count', self.object_list.db, str(query))
+        count = cache.get(key)
+        if count is None:
+            count = self.estimate()
+            if count is None or count < settings.PAGINATION_ESTIMATE_MIN:
+                count = super().count
+            cache.set(key, count, settings.PAGINATION_COUNT_TIMEOUT)
+        return count
+
+    def estimate(self):
+        connection = connections[self.object_list.db]
+        if (not settings.PAGINATION_COUNT_ESTIMATE
+                or connection.vendor != 'postgresql'):
+            return None
+        sql, params = self.object_list.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+    max_page_size = 100
+    count_query_param = 'count'
+    count_paginators = {
+        'exact': Paginator,
+        'approximate': ApproximateCountPaginator,
+        'none': CountFreePaginator,
+    }
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.django_paginator_class = self.count_paginators.get(
+            request.query_params.get(
+                self.count_query_param, settings.PAGINATION_COUNT_MODE),
+            Paginator)
+        return super().paginate_queryset(queryset, request, view)
+
+
+class RecipeCursorPagination(CursorPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        if self.cursor and not self.cursor.position:
+            self.cursor = None
+        reverse = bool(self.cursor and self.cursor.reverse)
+        position = (self.parse_position(self.cursor.position)
+                    if self.cursor else None)
+        results = self.get_results(queryset, position, reverse)
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+        self.has_next = bool(self.cursor) if reverse else has_more
+        self.has_previous = has_more if reverse else bool(self.cursor)
+        return self.page
+
+    def keyset(self, queryset, position, reverse, pk='id'):
+        lookup = 'gt' if reverse else 'lt'
+        queryset = queryset.order_by(
+            *(('pub_date', pk) if reverse else ('-pub_date', f'-{pk}')))
+        if position:
+            pub_date, value = position
+            queryset = queryset.filter(
+                Q(**{f'pub_date__{lookup}': pub_date})
+                | Q(pub_date=pub_date, **{f'{pk}__{lookup}': value}))
+        return queryset[:self.page_size + 1]
+
+    def get_results(self, queryset, position, reverse):
+        return list(self.keyset(queryset, position, reverse))
+
+    def parse_position(self, position):
+        pub_date, _, pk = position.rpartition('|')
+        pub_date = parse_datetime(pub_date)
+        if pub_date is None or not pk.isdigit():
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, int(pk)
+
+    @staticmethod
+    def get_position(recipe):
+        return f'{recipe.pub_date.isoformat()}|{recipe.id}'
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=self.get_position(
+                self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=True, position=self.get_position(
+                self.page[0])))
+
+
+class FeedCursorPagination(RecipeCursorPagination):
+    def get_results(self, queryset, position, reverse):
+        user = self.request.user
+        recipe_ids = list(self.keyset(
+            FeedEntry.objects.filter(user=user).values_list(
+                'recipe_id', flat=True),
+            position, reverse, 'recipe_id'))
+        recipes = list(queryset.filter(id__in=recipe_ids))
+        authors = Follow.objects.filter(
+            user=user, author__followers_count__gt=settings.FEED_FANOUT_LIMIT
+        ).values('author')
+        recipes += self.keyset(
+            queryset.filter(author__in=authors), position, reverse)
+        return sorted(
+            {recipe.id: recipe for recipe in recipes}.values(),
+            key=lambda recipe: (recipe.pub_date, recipe.id),
+            reverse=not reverse,
+        )[:self.page_size + 1]
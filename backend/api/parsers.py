@@ -0,0 +1,48 @@
+import json
+
+from django.conf import settings
+from django.utils.datastructures import MultiValueDict
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import DataAndFiles, JSONParser, MultiPartParser
+
+REQUEST_OVERHEAD = 1024 * 1024
+
+
+class RequestTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Размер запроса превышает допустимый.'
+    default_code = 'request_too_large'
+
+
+def check_content_length(parser_context, max_length):
+    request = parser_context['request']
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        length = 0
+    if length > max_length:
+        raise RequestTooLarge()
+
+
+class RecipeJSONParser(JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        check_content_length(
+            parser_context,
+            settings.RECIPE_IMAGE_MAX_BYTES * 4 // 3 + REQUEST_OVERHEAD)
+        return super().parse(stream, media_type, parser_context)
+
+
+class RecipeMultiPartParser(MultiPartParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        check_content_length(
+            parser_context,
+            settings.RECIPE_IMAGE_MAX_BYTES + REQUEST_OVERHEAD)
+        parsed = super().parse(stream, media_type, parser_context)
+        try:
+            data = json.loads(parsed.data.get('data') or '{}')
+        except ValueError as error:
+            raise ParseError(f'Поле data должно содержать JSON: {error}')
+        if not isinstance(data, dict):
+            raise ParseError('Поле data должно содержать JSON-объект')
+        return DataAndFiles({**data, **parsed.files.dict()}, MultiValueDict())
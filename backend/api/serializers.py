@@ -1,14 +1,24 @@
+import logging
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
 from django.db import transaction
-from django.shortcuts import get_object_or_404
 from djoser.serializers import UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from recipes import images
 from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingListItem, Tag)
 from users.models import Follow, User
 
+from .caching import invalidate_recipe
+from .fields import RecipeImageField
+
+logger = logging.getLogger(__name__)
+
 
 class CustomUserSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField(
@@ -23,6 +33,8 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, author):
+        if hasattr(author, 'is_subscribed'):
+            return author.is_subscribed
         request = self.context.get('request')
         return (request and request.user.is_authenticated
                 and author.following.filter(user=request.user).exists())
@@ -48,13 +60,30 @@ class FollowSerializer(serializers.ModelSerializer):
         return value
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    def to_representation(self, variants):
+        request = self.context.get('request')
+        return {
+            variant: {
+                extension: (
+                    request.build_absolute_uri(default_storage.url(name))
+                    if request else default_storage.url(name))
+                for extension, name in formats.items()
+            }
+            for variant, formats in variants.items()
+        }
+
+
 class RecipeShortSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
         fields = (
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time'
         )
 
@@ -85,20 +114,27 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         return self.context.get('request')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return obj.following.filter(
             user=self.get_request().user
         ).exists()
 
     def get_recipe(self, obj):
-        limit = self.get_request().GET.get('recipes_limit')
-        recipes = obj.author.all()
-        if limit:
-            recipes = recipes[:int(limit)]
+        if hasattr(obj, 'page_recipes'):
+            recipes = obj.page_recipes
+        else:
+            limit = self.get_request().GET.get('recipes_limit')
+            recipes = obj.author.all()
+            if limit:
+                recipes = recipes[:int(limit)]
         return RecipeShortSerializer(recipes, many=True,
                                      context={'request': self.get_request()}
                                      ).data
 
     def get_recipe_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.author.all().count()
 
 
@@ -127,7 +163,7 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
 
 
 class AddIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
@@ -141,6 +177,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     ingredients = IngredientInRecipeSerializer(source='ingredient_in_recipe',
                                                read_only=True, many=True)
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField(
         method_name='get_is_favorited')
     is_in_shopping_cart = serializers.SerializerMethodField(
@@ -150,7 +187,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = (
             'id', 'name', 'author',
-            'image', 'ingredients',
+            'image', 'image_variants', 'ingredients',
             'text', 'tags', 'cooking_time',
             'is_favorited', 'is_in_shopping_cart'
         )
@@ -162,16 +199,19 @@ class RecipeSerializer(serializers.ModelSerializer):
                                          recipe=obj).exists())
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return self.get_request(obj, Favorite)
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return self.get_request(obj, ShoppingCart)
 
 
 class AddRecipeSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True)
-    image = Base64ImageField()
+    tags = serializers.ListField(child=serializers.IntegerField())
+    image = RecipeImageField()
     ingredients = AddIngredientSerializer(many=True)
     author = CustomUserSerializer(read_only=True)
     cooking_time = serializers.IntegerField()
@@ -182,40 +222,48 @@ class AddRecipeSerializer(serializers.ModelSerializer):
                   'ingredients', 'name',
                   'image', 'text', 'cooking_time')
 
-    def validate_ingredient(self, value):
-        ingredient = value
-        if not ingredient:
+    def validate_ingredients(self, value):
+        if not value:
             raise serializers.ValidationError(
                 'Заполните поле ингредиентов'
             )
-        ingredients_list = []
-        for item in ingredient:
-            ingredients = get_object_or_404(Ingredient, id=item['id'])
-            if ingredients in ingredients_list:
-                raise serializers.ValidationError(
-                    'Ингредиенты не должны повторяться'
-                )
-            if int(item['amount']) <= 1:
-                raise serializers.ValidationError(
-                    'Количество ингредиентов должно быть больше одного'
-                )
-            ingredients_list.append(ingredients)
-        return value
+        ingredients = Ingredient.objects.in_bulk(
+            {item['id'] for item in value})
+        errors = []
+        seen = set()
+        for item in value:
+            error = {}
+            if item['id'] not in ingredients:
+                error['id'] = [f'Ингредиент {item["id"]} не найден']
+            elif item['id'] in seen:
+                error['id'] = ['Ингредиенты не должны повторяться']
+            if item['amount'] < settings.MIN_VALUE:
+                error['amount'] = [
+                    f'Количество должно быть не меньше {settings.MIN_VALUE}']
+            elif item['amount'] > settings.MAX_AMOUNT:
+                error['amount'] = [
+                    f'Количество должно быть не больше {settings.MAX_AMOUNT}']
+            seen.add(item['id'])
+            errors.append(error)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return [{**item, 'id': ingredients[item['id']]} for item in value]
 
     def validate_tags(self, value):
-        tags = value
-        if not tags:
+        if not value:
             raise serializers.ValidationError(
                 'Заполните поле тега'
             )
-        tag_list = []
-        for tag in tags:
-            if tag in tag_list:
-                raise serializers.ValidationError(
-                    'Тег должен быть уникальным'
-                )
-            tag_list.append(tag)
-        return value
+        tags = Tag.objects.in_bulk(set(value))
+        errors = []
+        missing = [str(pk) for pk in value if pk not in tags]
+        if missing:
+            errors.append(f'Теги не найдены: {", ".join(missing)}')
+        if len(set(value)) != len(value):
+            errors.append('Тег должен быть уникальным')
+        if errors:
+            raise serializers.ValidationError(errors)
+        return [tags[pk] for pk in value]
 
     def validate_cooking_time(self, data):
         if data <= 0:
@@ -225,7 +273,7 @@ class AddRecipeSerializer(serializers.ModelSerializer):
         return data
 
     def to_representation(self, instance):
-        return RecipeSerializer(instance).data
+        return RecipeSerializer(instance, context=self.context).data
 
     @transaction.atomic
     def create_ingredients(self, ingredients, recipe):
@@ -237,22 +285,87 @@ class AddRecipeSerializer(serializers.ModelSerializer):
             ) for ingredient in ingredients]
         )
 
+    @staticmethod
+    def process_image(recipe, tag_slugs):
+        images.schedule(recipe, partial(invalidate_recipe, recipe, tag_slugs))
+
     @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(author=self.context['request'].user,
                                        **validated_data)
+        validated_data['image'].close()
         recipe.tags.set(tags)
         self.create_ingredients(ingredients, recipe)
+        self.process_image(recipe, [tag.slug for tag in tags])
         return recipe
 
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        rows = {row.ingredient_id: row for row in
+                IngredientInRecipe.objects.filter(recipe=recipe)}
+        amounts = {item['id'].id: item['amount'] for item in ingredients}
+        deleted = [row.pk for pk, row in rows.items() if pk not in amounts]
+        created = [
+            IngredientInRecipe(recipe=recipe, ingredient_id=pk, amount=amount)
+            for pk, amount in amounts.items() if pk not in rows
+        ]
+        changed = []
+        for pk, row in rows.items():
+            if pk in amounts and row.amount != amounts[pk]:
+                row.amount = amounts[pk]
+                changed.append(row)
+        if deleted:
+            IngredientInRecipe.objects.filter(pk__in=deleted).delete()
+        IngredientInRecipe.objects.bulk_create(created)
+        IngredientInRecipe.objects.bulk_update(changed, ['amount'])
+        if created or changed:
+            ShoppingListItem.objects.refresh_recipe(
+                recipe.id, [row.ingredient_id for row in created + changed])
+        return len(deleted) + len(created) + len(changed)
+
+    @staticmethod
+    def update_tags(recipe, old_tags, tags):
+        new_tags = {tag.id for tag in tags}
+        removed = old_tags.keys() - new_tags
+        added = new_tags - old_tags.keys()
+        if removed:
+            recipe.tags.remove(*removed)
+        if added:
+            recipe.tags.add(*added)
+        return len(removed) + len(added)
+
     @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        instance.ingredients.clear()
-        self.create_ingredients(ingredients, instance)
-        instance.tags.clear()
-        instance.tags.set(tags)
-        return super().update(instance, validated_data)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        old_tags = dict(instance.tags.values_list('id', 'slug'))
+        touched = 0
+        if ingredients is not None:
+            touched += self.update_ingredients(instance, ingredients)
+        if tags is not None:
+            touched += self.update_tags(instance, old_tags, tags)
+        fields = [name for name, value in validated_data.items()
+                  if name == 'image' or getattr(instance, name) != value]
+        old_files = [instance.image.name,
+                     *images.variant_names(instance.image_variants)]
+        for name in fields:
+            setattr(instance, name, validated_data[name])
+        if fields:
+            instance.save(update_fields=fields)
+        if 'image' in validated_data:
+            validated_data['image'].close()
+        logger.info('Рецепт %s: изменено строк %s, полей %s',
+                    instance.pk, touched, len(fields))
+        if not touched and not fields:
+            return instance
+        tag_slugs = [*old_tags.values(), *(tag.slug for tag in tags or ())]
+        invalidate_recipe(instance, tag_slugs)
+        if instance.image.name != old_files[0]:
+            instance.image_variants = {}
+            Recipe.objects.filter(pk=instance.pk).update(image_variants={})
+            transaction.on_commit(
+                partial(images.delete_unused_files, old_files))
+            self.process_image(instance, tag_slugs)
+        return instance
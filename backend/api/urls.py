@@ -1,16 +1,32 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from .async_views import async_view
 from .views import IngredientViewSet, RecipeViewSet, TagViewSet
 
 app_name = 'api'
 
+ASYNC_ROUTES = (
+    'recipe-list',
+    'recipe-detail',
+    'recipe-download-shopping-cart',
+    'recipe-export',
+    'ingredient-list',
+)
+
 router = DefaultRouter()
 
 router.register('ingredients', IngredientViewSet)
 router.register('tags', TagViewSet)
 router.register('recipes', RecipeViewSet)
 
+router_urls = router.urls
+if settings.ASYNC_VIEWS:
+    for pattern in router_urls:
+        if pattern.name in ASYNC_ROUTES:
+            pattern.callback = async_view(pattern.callback)
+
 urlpatterns = [
-    path('', include(router.urls)),
+    path('', include(router_urls)),
 ]
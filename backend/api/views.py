@@ -1,26 +1,62 @@
+import os
+from collections import defaultdict
+
 from django.conf import settings
-from django.db.models import F, Sum
-from django.http import HttpResponse
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+from django.db.models import (BooleanField, Count, Exists, F, IntegerField,
+                              OuterRef, Subquery, Value,
+                              prefetch_related_objects)
+from django.db.models.functions import Coalesce
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
+from djoser.views import UserViewSet
 from rest_framework import status, views, viewsets
 from rest_framework.decorators import action
 from rest_framework.generics import GenericAPIView
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
-from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.models import (Favorite, FavoriteCounter, Ingredient, Recipe,
+                            ShoppingCart, Tag, reading_prefetches)
+from recipes.search import ingredient_index
 from users.models import Follow, User
 
+from .caching import (cached_response_data, detail_key, is_cacheable, list_key,
+                      recipe_fragments)
+from .exports import SHOPPING_LIST_WRITERS, gzip_stream, recipes_ndjson
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import CustomPagination
+from .mixins import ReferenceDataMixin
+from .pagination import (CustomPagination, FeedCursorPagination,
+                         RecipeCursorPagination)
+from .parsers import RecipeJSONParser, RecipeMultiPartParser
 from .permissions import IsAuthorOrReadOnly
+from .renderers import CSVRenderer, NDJSONRenderer, PDFRenderer, TextRenderer
 from .serializers import (AddRecipeSerializer, FollowSerializer,
                           IngredientSerializer, RecipeSerializer,
                           RecipeShortSerializer, SubscriptionSerializer,
                           TagSerializer)
 
 
+class CustomUserViewSet(UserViewSet):
+    pagination_class = CustomPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_subscribed=Value(False, BooleanField()))
+        return queryset.annotate(is_subscribed=Exists(
+            Follow.objects.filter(user=user, author=OuterRef('pk'))))
+
+
 class SubscriptionView(GenericAPIView):
     serializer_class = SubscriptionSerializer
     pagination_class = CustomPagination
@@ -28,8 +64,25 @@ class SubscriptionView(GenericAPIView):
 
     def get(self, request):
         user = request.user
-        queryset = User.objects.filter(following__user=user)
+        recipes_count = Recipe.objects.filter(
+            author=OuterRef('pk')
+        ).order_by().values('author').annotate(count=Count('pk'))
+        queryset = User.objects.filter(following__user=user).annotate(
+            is_subscribed=Value(True, BooleanField()),
+            recipes_count=Coalesce(
+                Subquery(recipes_count.values('count'),
+                         output_field=IntegerField()), 0),
+        )
         pages = self.paginate_queryset(queryset)
+        limit = request.query_params.get('recipes_limit')
+        recipes = defaultdict(list)
+        for recipe in Recipe.objects.first_per_author(
+            [author.id for author in pages],
+            int(limit) if limit and limit.isdigit() else None
+        ):
+            recipes[recipe.author_id].append(recipe)
+        for author in pages:
+            author.page_recipes = recipes[author.id]
         serializer = SubscriptionSerializer(pages, many=True,
                                             context={'request': request})
         return self.get_paginated_response(serializer.data)
@@ -58,15 +111,29 @@ class FollowView(views.APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReferenceDataMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = [AllowAny]
     filterset_class = IngredientFilter
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        limit = request.query_params.get('limit', '')
+        limit = min(
+            int(limit) if limit.isdigit() and int(limit) > 0
+            else settings.INGREDIENT_AUTOCOMPLETE_LIMIT,
+            settings.INGREDIENT_AUTOCOMPLETE_MAX_LIMIT,
+        )
+        if request.query_params.get('fuzzy') in ('1', 'true'):
+            return Response(ingredient_index.fuzzy(name, limit))
+        return Response(ingredient_index.autocomplete(name, limit))
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagViewSet(ReferenceDataMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [AllowAny]
@@ -77,14 +144,82 @@ class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = [IsAuthorOrReadOnly]
     pagination_class = CustomPagination
+    parser_classes = (RecipeJSONParser, RecipeMultiPartParser)
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
 
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.action == 'feed':
+                self._paginator = FeedCursorPagination()
+            elif (RecipeCursorPagination.cursor_query_param
+                  in self.request.query_params):
+                self._paginator = RecipeCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        if self.request.method == 'GET':
+            return Recipe.objects.for_reading(self.request.user)
+        return super().get_queryset()
+
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return RecipeSerializer
         return AddRecipeSerializer
 
+    def get_page_queryset(self):
+        user = self.request.user
+        return self.filter_queryset(Recipe.objects.with_user_flags(
+            user).with_author_subscription(user))
+
+    def serialize_fragments(self, recipes):
+        prefetch_related_objects(
+            recipes, *reading_prefetches(AnonymousUser()))
+        return RecipeSerializer(
+            recipes, many=True, context=self.get_serializer_context()).data
+
+    def list_data(self, request):
+        recipes = self.paginate_queryset(self.get_page_queryset())
+        return self.get_paginated_response(recipe_fragments(
+            request, recipes, self.serialize_fragments)).data
+
+    def retrieve_data(self, request):
+        recipe = get_object_or_404(
+            self.get_page_queryset(), pk=self.kwargs['pk'])
+        self.check_object_permissions(request, recipe)
+        return recipe_fragments(
+            request, [recipe], self.serialize_fragments)[0]
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        if not is_cacheable(request):
+            return Response(self.list_data(request))
+        return Response(cached_response_data(
+            list_key(request), lambda: self.list_data(request)))
+
+    def retrieve(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().retrieve(request, *args, **kwargs)
+        if not kwargs['pk'].isdigit():
+            raise Http404
+        if not is_cacheable(request):
+            return Response(self.retrieve_data(request))
+        return Response(cached_response_data(
+            detail_key(request, kwargs['pk']),
+            lambda: self.retrieve_data(request)))
+
+    @action(detail=False, permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        user = request.user
+        recipes = self.paginate_queryset(Recipe.objects.with_user_flags(
+            user).with_author_subscription(user))
+        return self.get_paginated_response(recipe_fragments(
+            request, recipes, self.serialize_fragments))
+
     @staticmethod
     def create_obj(request, pk, model, serializer):
         recipe = get_object_or_404(Recipe, pk=pk)
@@ -97,50 +232,104 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @staticmethod
     def delete_obj(request, pk, model):
-        get_object_or_404(model, recipe=pk, user=request.user).delete()
+        deleted, _ = model.objects.filter(
+            recipe=pk, user=request.user).delete()
+        if not deleted:
+            raise Http404
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post'],
             permission_classes=[IsAuthenticated])
+    @transaction.atomic
     def favorite(self, request, pk):
-        return RecipeViewSet.create_obj(
+        response = RecipeViewSet.create_obj(
             request, pk, Favorite, RecipeShortSerializer)
+        if response.status_code == status.HTTP_201_CREATED:
+            FavoriteCounter.objects.add(pk, 1)
+        return response
 
     @favorite.mapping.delete
+    @transaction.atomic
     def delete_favorite(self, request, pk):
-        return RecipeViewSet.delete_obj(request, pk, Favorite)
+        response = RecipeViewSet.delete_obj(request, pk, Favorite)
+        if response.status_code == status.HTTP_204_NO_CONTENT:
+            FavoriteCounter.objects.add(pk, -1)
+        return response
 
     @action(detail=True, methods=['post'],
             permission_classes=[IsAuthenticated])
+    @transaction.atomic
     def shopping_cart(self, request, pk):
         return RecipeViewSet.create_obj(
             request, pk, ShoppingCart, RecipeShortSerializer)
 
     @shopping_cart.mapping.delete
+    @transaction.atomic
     def delete_shopping_cart(self, request, pk):
         return RecipeViewSet.delete_obj(request, pk, ShoppingCart)
 
     @staticmethod
-    def txt_convert(ingredients):
-        shopping_list = []
-        for _ in ingredients:
-            shopping_list.append(
-                f'{_["name"]}: {_["total"]} {_["measurement"]}'
+    def shopping_list_response(request, ingredients):
+        user = request.user
+        file_format = request.accepted_renderer.format
+        modified = user.shopping_list_modified
+        etag = quote_etag('{}-{}-{}'.format(
+            user.id,
+            int(modified.timestamp() * 1000000) if modified else 0,
+            file_format,
+        ))
+        last_modified = int(modified.timestamp()) if modified else None
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = StreamingHttpResponse(
+                SHOPPING_LIST_WRITERS[file_format](ingredients.iterator()),
+                content_type=request.accepted_media_type,
             )
-        text = '\n'.join(shopping_list)
-        filename = settings.SHOPPING_CARD
-        response = HttpResponse(text, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename={filename}'
+            filename = os.path.splitext(settings.SHOPPING_CARD)[0]
+            response['Content-Disposition'] = (
+                f'attachment; filename={filename}.{file_format}')
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def perform_content_negotiation(self, request, force=False):
+        return super().perform_content_negotiation(
+            request, force=force or self.action == 'export')
+
+    @action(methods=['get'], detail=False,
+            permission_classes=(IsAdminUser,),
+            renderer_classes=(NDJSONRenderer,))
+    def export(self, request):
+        since_id = request.query_params.get('since_id', '')
+        recipes = self.filter_queryset(
+            Recipe.objects.with_user_flags(AnonymousUser())
+        ).filter(
+            id__gt=int(since_id) if since_id.isdigit() else 0
+        ).order_by('id').iterator(
+            chunk_size=settings.RECIPE_EXPORT_CHUNK_SIZE)
+        content = recipes_ndjson(recipes, self.serialize_fragments,
+                                 settings.RECIPE_EXPORT_CHUNK_SIZE)
+        compress = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        response = StreamingHttpResponse(
+            gzip_stream(content) if compress else content,
+            content_type=request.accepted_media_type)
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        response['Cache-Control'] = 'private, no-store'
         return response
 
     @action(methods=['get'], detail=False,
-            permission_classes=(IsAuthenticated,))
+            permission_classes=(IsAuthenticated,),
+            renderer_classes=(TextRenderer, CSVRenderer, JSONRenderer,
+                              PDFRenderer))
     def download_shopping_cart(self, request):
-        ingredients = Ingredient.objects.filter(
-            recipe__shopping_cart__user=request.user).values(
-            'name',
-            measurement=F('measurement_unit')
-        ).order_by(
-            'name'
-        ).annotate(total=Sum('ingredients_list__amount'))
-        return self.txt_convert(ingredients)
+        ingredients = request.user.shopping_list.values(
+            name=F('ingredient__name'),
+            measurement=F('ingredient__measurement_unit'),
+            total=F('amount'),
+        ).order_by('name')
+        return self.shopping_list_response(request, ingredients)
@@ -0,0 +1,22 @@
+import os
+import time
+
+from django.db.backends.signals import connection_created
+
+from .settings import *  # noqa: F401,F403
+
+DB_QUERY_DELAY = float(os.getenv('DB_QUERY_DELAY', 0))
+
+
+def delay_query(execute, sql, params, many, context):
+    time.sleep(DB_QUERY_DELAY / 1000)
+    return execute(sql, params, many, context)
+
+
+def add_query_delay(connection, **kwargs):
+    if delay_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(delay_query)
+
+
+if DB_QUERY_DELAY:
+    connection_created.connect(add_query_delay)
@@ -1,8 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.models import Group
 
-from .models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
-                     ShoppingCart, Tag)
+from .models import (Favorite, FeedEntry, Ingredient, IngredientInRecipe,
+                     Recipe, ShoppingCart, ShoppingListItem, Tag)
 
 
 @admin.register(Ingredient)
@@ -38,7 +38,7 @@ class IngredientRecipeInline(admin.TabularInline):
 class RecipeAdmin(admin.ModelAdmin):
     inlines = (IngredientRecipeInline,)
     list_display = ('pk', 'name', 'author', 'text',
-                    'cooking_time', 'is_favorited',
+                    'cooking_time', 'pub_date', 'favorites_count',
                     'ingredients_in_recipe')
     fields = ('name', 'text',
               'author', 'image',
@@ -46,11 +46,7 @@ class RecipeAdmin(admin.ModelAdmin):
     search_fields = ('name', 'author')
     list_filter = ('name', 'author', 'tags')
     empty_value_display = '-пусто-'
-    readonly_fields = ('is_favorited',)
-
-    @admin.display(description='Количество избраного')
-    def is_favorited(self, obj):
-        return obj.favorite.count()
+    readonly_fields = ('favorites_count',)
 
     @admin.display(description='Ингредиенты')
     def ingredients_in_recipe(self, obj):
@@ -79,4 +75,25 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'ingredient', 'amount')
+    search_fields = (
+        'user__username',
+        'user__email',
+        'ingredient__name'
+    )
+
+
+@admin.register(FeedEntry)
+class FeedEntryAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'recipe', 'author', 'pub_date')
+    list_select_related = ('user', 'recipe', 'author')
+    search_fields = (
+        'user__username',
+        'user__email',
+        'recipe__name'
+    )
+
+
 admin.site.unregister(Group)
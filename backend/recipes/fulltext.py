@@ -0,0 +1,222 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+SQLITE_TABLE = 'recipes_recipe_fts'
+POSTGRESQL_TABLE = 'recipes_recipe_search'
+POSTGRESQL_INDEX = f'{POSTGRESQL_TABLE}_document_idx'
+SQLITE_WEIGHTS = (10.0, 1.0)
+POSTGRESQL_DOCUMENT = (
+    "setweight(to_tsvector('russian', %s), 'A') || "
+    "setweight(to_tsvector('russian', %s), 'B')"
+)
+
+VOWELS = 'аеиоуыэюя'
+PERFECTIVE_GERUND = (('в', 'вши', 'вшись'),
+                     ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+ADJECTIVE = ((), ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый',
+                  'ой', 'ем', 'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому',
+                  'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею'))
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+REFLEXIVE = ((), ('ся', 'сь'))
+VERB = (('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+         'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+        ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+         'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+         'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'))
+NOUN = ((), ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи',
+             'ии', 'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием',
+             'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию',
+             'ью', 'ю', 'ия', 'ья', 'я'))
+SUPERLATIVE = ((), ('ейше', 'ейш'))
+DERIVATIONAL = ((), ('ость', 'ост'))
+
+
+def normalize(value):
+    return value.casefold().replace('ё', 'е')
+
+
+def remove_ending(word, groups):
+    after_a, plain = groups
+    endings = sorted(
+        [(ending, True) for ending in after_a]
+        + [(ending, False) for ending in plain],
+        key=lambda item: -len(item[0]),
+    )
+    for ending, needs_a in endings:
+        if word.endswith(ending):
+            stem = word[:-len(ending)]
+            if not needs_a or stem.endswith(('а', 'я')):
+                return stem
+    return None
+
+
+def region_after_consonant(word, start):
+    for position in range(start + 1, len(word)):
+        if word[position] not in VOWELS and word[position - 1] in VOWELS:
+            return position + 1
+    return len(word)
+
+
+def stem(word):
+    word = normalize(word)
+    rv_start = next(
+        (position + 1 for position, char in enumerate(word)
+         if char in VOWELS), len(word))
+    prefix, rv = word[:rv_start], word[rv_start:]
+    r2_start = region_after_consonant(
+        word, region_after_consonant(word, 0) - 1) - rv_start
+
+    result = remove_ending(rv, PERFECTIVE_GERUND)
+    if result is None:
+        rv = remove_ending(rv, REFLEXIVE) or rv
+        result = remove_ending(rv, ADJECTIVE)
+        if result is not None:
+            result = remove_ending(result, PARTICIPLE) or result
+        else:
+            result = remove_ending(rv, VERB)
+            if result is None:
+                result = remove_ending(rv, NOUN)
+    if result is not None:
+        rv = result
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    result = remove_ending(rv, DERIVATIONAL)
+    if result is not None and len(result) >= r2_start:
+        rv = result
+
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        result = remove_ending(rv, SUPERLATIVE)
+        if result is not None:
+            rv = result[:-1] if result.endswith('нн') else result
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def words(text):
+    return re.findall(r'\w+', normalize(text))
+
+
+def stemmed(text):
+    return ' '.join(stem(word) for word in words(text))
+
+
+def create_index(schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {SQLITE_TABLE} '
+            "USING fts5(name, text, tokenize='unicode61')")
+
+
+def drop_index(schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SQLITE_TABLE}')
+
+
+def create_document_index(schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX {POSTGRESQL_INDEX} '
+            f'ON {POSTGRESQL_TABLE} USING gin (document)')
+
+
+def drop_document_index(schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {POSTGRESQL_INDEX}')
+
+
+def index_recipes(recipes):
+    rows = [(recipe.id, recipe.name, recipe.text) for recipe in recipes]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(
+                f'DELETE FROM {SQLITE_TABLE} WHERE rowid = %s',
+                [(pk,) for pk, _, _ in rows])
+            cursor.executemany(
+                f'INSERT INTO {SQLITE_TABLE} (rowid, name, text) '
+                'VALUES (%s, %s, %s)',
+                [(pk, stemmed(name), stemmed(text))
+                 for pk, name, text in rows])
+        elif connection.vendor == 'postgresql':
+            cursor.executemany(
+                f'INSERT INTO {POSTGRESQL_TABLE} (recipe_id, document) '
+                f'VALUES (%s, {POSTGRESQL_DOCUMENT}) '
+                'ON CONFLICT (recipe_id) '
+                'DO UPDATE SET document = EXCLUDED.document',
+                rows)
+
+
+def remove_recipes(recipe_ids):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(
+                f'DELETE FROM {SQLITE_TABLE} WHERE rowid = %s',
+                [(pk,) for pk in recipe_ids])
+        elif connection.vendor == 'postgresql':
+            cursor.executemany(
+                f'DELETE FROM {POSTGRESQL_TABLE} WHERE recipe_id = %s',
+                [(pk,) for pk in recipe_ids])
+
+
+def rebuild_index(recipes, batch_size=1000):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {SQLITE_TABLE}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'DELETE FROM {POSTGRESQL_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {POSTGRESQL_TABLE} (recipe_id, document) '
+                'SELECT id, ' + POSTGRESQL_DOCUMENT % ('name', 'text')
+                + ' FROM recipes_recipe')
+            return
+    batch = []
+    for recipe in recipes.only('id', 'name', 'text').iterator(
+            chunk_size=batch_size):
+        batch.append(recipe)
+        if len(batch) >= batch_size:
+            index_recipes(batch)
+            batch = []
+    index_recipes(batch)
+
+
+def sqlite_query(value):
+    terms = [stem(word) for word in words(value)]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"' for term in terms[:-1]) + f' "{terms[-1]}"*'
+
+
+def search(queryset, value):
+    table = queryset.model._meta.db_table
+    if connection.vendor == 'sqlite':
+        query = sqlite_query(value)
+        if query is None:
+            return queryset
+        weights = ', '.join(str(weight) for weight in SQLITE_WEIGHTS)
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {SQLITE_TABLE} '
+            f'WHERE {SQLITE_TABLE} MATCH %s', (query,)
+        )).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({SQLITE_TABLE}, {weights}) FROM {SQLITE_TABLE} '
+            f'WHERE {SQLITE_TABLE} MATCH %s AND rowid = {table}.id',
+            (query,)
+        )).order_by(F('search_rank').desc(nulls_last=True), 'pk')
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(value, config='russian', search_type='websearch')
+        return queryset.filter(search_document__document=query).annotate(
+            search_rank=SearchRank(F('search_document__document'), query)
+        ).order_by('-search_rank', 'pk')
+    for word in words(value):
+        queryset = queryset.filter(
+            Q(name__icontains=word) | Q(text__icontains=word))
+    return queryset
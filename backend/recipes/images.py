@@ -0,0 +1,141 @@
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = (
+    ('thumbnail', (320, 320), True),
+    ('medium', (1280, 1280), False),
+)
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+SIGNATURE = hashlib.md5(repr((VARIANTS, FORMATS)).encode()).hexdigest()[:8]
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    return ThreadPoolExecutor(max_workers=settings.RECIPE_IMAGE_WORKERS,
+                              thread_name_prefix='recipe-images')
+
+
+def resize(image, size, crop):
+    if crop:
+        return ImageOps.fit(image, size, Image.LANCZOS)
+    image = image.copy()
+    image.thumbnail(size, Image.LANCZOS)
+    return image
+
+
+def encode(image, image_format, options):
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A')
+                         if 'A' in image.getbands() else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def variant_name(name, variant, extension):
+    return f'{os.path.splitext(name)[0]}.{variant}.{SIGNATURE}.{extension}'
+
+
+def generate_variants(name):
+    variants = {
+        variant: {extension: variant_name(name, variant, extension)
+                  for extension, _, _ in FORMATS}
+        for variant, _, _ in VARIANTS
+    }
+    if all(default_storage.claim(target) for target in variant_names(
+            variants)):
+        return variants
+    with default_storage.open(name) as file:
+        image = Image.open(file)
+        image.draft(image.mode, max(size for _, size, _ in VARIANTS))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info
+                                  else 'RGB')
+    for variant, size, crop in VARIANTS:
+        resized = resize(image, size, crop)
+        for extension, image_format, options in FORMATS:
+            variants[variant][extension] = default_storage.save(
+                variants[variant][extension],
+                encode(resized, image_format, options))
+    return variants
+
+
+def variant_names(variants):
+    return [name for formats in variants.values()
+            for name in formats.values()]
+
+
+def delete_unused_files(names):
+    names = {name for name in names if name}
+    used = set()
+    for image, variants in Recipe.objects.filter(
+            image__in=names).values_list('image', 'image_variants'):
+        used.add(image)
+        used.update(variant_names(variants))
+    claimed_after = timezone.now() - timedelta(
+        seconds=settings.RECIPE_FILE_GRACE)
+    deleted = 0
+    for name in names - used:
+        try:
+            if default_storage.get_modified_time(name) > claimed_after:
+                continue
+        except FileNotFoundError:
+            continue
+        default_storage.delete(name)
+        deleted += 1
+    return deleted
+
+
+def process(recipe_id, name, callback=None):
+    try:
+        recipe = Recipe.objects.filter(pk=recipe_id, image=name)
+        previous = recipe.values_list('image_variants', flat=True).first()
+        variants = generate_variants(name)
+        if not recipe.update(image_variants=variants):
+            delete_unused_files([name, *variant_names(variants)])
+            return False
+        delete_unused_files([name, *variant_names(previous or {})])
+        if callback is not None:
+            callback()
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', name)
+        return False
+    return True
+
+
+def process_in_worker(*args):
+    try:
+        process(*args)
+    finally:
+        connections.close_all()
+
+
+def schedule(recipe, callback=None):
+    args = (recipe.pk, recipe.image.name, callback)
+    if not settings.RECIPE_IMAGE_WORKERS:
+        transaction.on_commit(lambda: process(*args))
+    else:
+        transaction.on_commit(
+            lambda: get_executor().submit(process_in_worker, *args))
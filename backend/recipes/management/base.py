@@ -0,0 +1,111 @@
+import csv
+import os
+import sys
+from collections import Counter
+from contextlib import nullcontext
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from api.caching import invalidate_recipes
+from recipes.models import Recipe, ReferenceDataVersion
+
+DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+
+
+class BulkLoadCommand(BaseCommand):
+    help = ('Load rows from a csv file into the database, inserting new '
+            'and updating changed ones. Use "-" to read from stdin')
+    model = None
+    filename = None
+    fields = ()
+    key = None
+    recipe_lookup = None
+
+    def add_arguments(self, parser):
+        parser.add_argument('filename', default=self.filename, nargs='?',
+                            type=str)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count changes and roll them back')
+
+    def open(self, filename):
+        if filename == '-':
+            return nullcontext(sys.stdin)
+        try:
+            return open(os.path.join(DATA_ROOT, filename), newline='',
+                        encoding='utf8')
+        except FileNotFoundError:
+            raise CommandError(f'Добавьте файл {filename} в директорию data')
+
+    def read(self, csv_file):
+        reader = csv.reader(csv_file)
+        for row in reader:
+            if not row:
+                continue
+            if len(row) != len(self.fields):
+                raise CommandError(
+                    f'Строка {reader.line_num}: ожидается {len(self.fields)} '
+                    f'столбца ({", ".join(self.fields)}), получено {len(row)}')
+            yield self.model(**dict(zip(self.fields, row)))
+
+    def upsert(self, objects):
+        manager = self.model.objects
+        update_fields = [field for field in self.fields if field != self.key]
+        unique = {getattr(obj, self.key): obj for obj in objects}
+        existing = manager.in_bulk(list(unique), field_name=self.key)
+        created, changed = [], []
+        for key, obj in unique.items():
+            current = existing.get(key)
+            if current is None:
+                created.append(obj)
+            elif any(getattr(current, field) != getattr(obj, field)
+                     for field in update_fields):
+                obj.pk = current.pk
+                changed.append(obj)
+        inserted = 0
+        if created:
+            manager.bulk_create(created, ignore_conflicts=True)
+            inserted = manager.filter(**{f'{self.key}__in': [
+                getattr(obj, self.key) for obj in created]}).count()
+        manager.bulk_update(changed, update_fields)
+        if changed and self.recipe_lookup:
+            invalidate_recipes(Recipe.objects.filter(
+                **{f'{self.recipe_lookup}__in': changed}))
+        return Counter(inserted=inserted, updated=len(changed),
+                       skipped=len(objects) - inserted - len(changed))
+
+    def invalidate(self):
+        ReferenceDataVersion.objects.bump(self.model._meta.db_table)
+
+    def load(self, csv_file, batch_size, dry_run, counts):
+        objects = self.read(csv_file)
+        with transaction.atomic() if dry_run else nullcontext():
+            for chunk in iter(
+                lambda: list(islice(objects, batch_size)), []
+            ):
+                try:
+                    with transaction.atomic():
+                        counts.update(self.upsert(chunk))
+                except IntegrityError as error:
+                    raise CommandError(f'Ошибка загрузки: {error}')
+            if dry_run:
+                transaction.set_rollback(True)
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        counts = Counter()
+        try:
+            with self.open(options['filename']) as csv_file:
+                self.load(csv_file, options['batch_size'], dry_run, counts)
+        finally:
+            if not dry_run and (counts['inserted'] or counts['updated']):
+                self.invalidate()
+        self.stdout.write(
+            '{}Добавлено: {inserted}, обновлено: {updated}, '
+            'пропущено: {skipped}'.format(
+                'Пробный запуск. ' if dry_run else '',
+                **{name: counts[name]
+                   for name in ('inserted', 'updated', 'skipped')}))
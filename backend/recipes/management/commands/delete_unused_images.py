@@ -0,0 +1,21 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from recipes import images
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Delete recipe images and variants that no recipe references '
+            'and nobody has claimed within RECIPE_FILE_GRACE')
+
+    def handle(self, *args, **options):
+        root = Recipe._meta.get_field('image').upload_to
+        deleted = 0
+        if default_storage.exists(root):
+            for directory in default_storage.listdir(root)[0]:
+                path = f'{root}{directory}'
+                deleted += images.delete_unused_files(
+                    f'{path}/{name}'
+                    for name in default_storage.listdir(path)[1])
+        self.stdout.write(f'Удалено файлов: {deleted}')
@@ -0,0 +1,260 @@
+import csv
+import io
+import os
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from recipes import fulltext
+from recipes.models import (Favorite, FavoriteCounter, FeedEntry, Ingredient,
+                            IngredientInRecipe, Recipe, ShoppingCart,
+                            ShoppingListItem, Tag)
+from users.models import Follow, User
+
+FAKE_IMAGE = 'recipe/fake.png'
+FAKE_PASSWORD = 'fake-password'
+NULL = r'\N'
+PUBLICATION_PERIOD = 365 * 24 * 60 * 60
+
+
+class BatchWriter:
+    def __init__(self, model, fields, batch_size):
+        self.model = model
+        self.fields = fields
+        self.batch_size = batch_size
+        self.use_copy = connection.vendor == 'postgresql'
+        self.rows = []
+        self.total = 0
+
+    def add(self, *values):
+        self.rows.append(values)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        with transaction.atomic():
+            if self.use_copy:
+                self.copy()
+            else:
+                self.model.objects.bulk_create(
+                    [self.model(**dict(zip(self.fields, row)))
+                     for row in self.rows],
+                    batch_size=self.batch_size,
+                )
+        self.total += len(self.rows)
+        self.rows = []
+
+    def copy(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in self.rows:
+            writer.writerow([
+                NULL if value is None
+                else ('t' if value else 'f') if isinstance(value, bool)
+                else value
+                for value in row
+            ])
+        buffer.seek(0)
+        opts = self.model._meta
+        columns = ', '.join(
+            connection.ops.quote_name(opts.get_field(field).column)
+            for field in self.fields
+        )
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert(
+                f'COPY {connection.ops.quote_name(opts.db_table)} '
+                f"({columns}) FROM STDIN WITH (FORMAT csv, NULL '{NULL}')",
+                buffer,
+            )
+
+    def close(self):
+        self.flush()
+        return self.total
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic fake dataset for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--authors-share', type=float, default=0.2,
+                            help='Share of users who publish recipes')
+        parser.add_argument('--recipes-per-author', type=float, default=10,
+                            help='Mean of an exponential distribution')
+        parser.add_argument('--ingredients-per-recipe', type=int, nargs=2,
+                            default=(3, 15), metavar=('MIN', 'MAX'))
+        parser.add_argument('--tags-per-recipe', type=int, nargs=2,
+                            default=(1, 3), metavar=('MIN', 'MAX'))
+        parser.add_argument('--follows-per-user', type=float, default=5,
+                            help='Mean of an exponential distribution')
+        parser.add_argument('--favorites-per-user', type=float, default=10,
+                            help='Mean of an exponential distribution')
+        parser.add_argument('--cart-per-user', type=float, default=3,
+                            help='Mean of an exponential distribution')
+        parser.add_argument('--skew', type=float, default=1.0,
+                            help='Zipf exponent of author and recipe '
+                                 'popularity, 0 for uniform')
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.started = time.monotonic()
+        ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True))
+        tag_ids = list(Tag.objects.order_by('id').values_list('id', flat=True))
+        if not ingredient_ids or not tag_ids:
+            raise CommandError(
+                'Сначала загрузите ингредиенты и теги командами '
+                'load_ingredients и load_tags')
+        self.create_image()
+        user_ids = self.generate_users()
+        author_ids = user_ids[:max(
+            1, int(len(user_ids) * options['authors_share']))]
+        recipe_ids = self.generate_recipes(author_ids)
+        self.generate_recipe_relations(recipe_ids, ingredient_ids, tag_ids)
+        self.generate_follows(user_ids, author_ids)
+        self.generate_user_recipes(
+            Favorite, user_ids, recipe_ids, options['favorites_per_user'])
+        self.generate_user_recipes(
+            ShoppingCart, user_ids, recipe_ids, options['cart_per_user'])
+        self.reset_sequences()
+        ShoppingListItem.objects.rebuild(
+            user_ids, batch_size=options['batch_size'])
+        self.log(ShoppingListItem, ShoppingListItem.objects.filter(
+            user__in=user_ids).count())
+        FavoriteCounter.objects.reconcile(batch_size=options['batch_size'])
+        FeedEntry.objects.rebuild(user_ids, batch_size=options['batch_size'])
+        self.log(FeedEntry, FeedEntry.objects.filter(
+            user__in=user_ids).count())
+        fulltext.rebuild_index(
+            Recipe.objects.all(), batch_size=options['batch_size'])
+        self.log(Recipe, Recipe.objects.count())
+
+    def log(self, model, total):
+        self.stdout.write(
+            f'{model._meta.verbose_name_plural}: {total} '
+            f'({time.monotonic() - self.started:.1f} с)')
+
+    def writer(self, model, fields):
+        return BatchWriter(model, fields, self.options['batch_size'])
+
+    def next_id(self, model):
+        return (model.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+
+    def count(self, mean):
+        return int(self.rng.expovariate(1 / mean)) if mean > 0 else 0
+
+    def popularity(self, size):
+        return list(accumulate(
+            1 / (rank + 1) ** self.options['skew'] for rank in range(size)))
+
+    def choose(self, population, cum_weights, k):
+        k = min(k, len(population))
+        chosen = set()
+        for _ in range(k * 3):
+            if len(chosen) >= k:
+                break
+            chosen.update(self.rng.choices(
+                population, cum_weights=cum_weights, k=k - len(chosen)))
+        return chosen
+
+    def create_image(self):
+        path = os.path.join(settings.MEDIA_ROOT, FAKE_IMAGE)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            Image.new('RGB', (1, 1), 'white').save(path)
+
+    def generate_users(self):
+        first_id = self.next_id(User)
+        ids = range(first_id, first_id + self.options['users'])
+        password = make_password(FAKE_PASSWORD)
+        now = timezone.now()
+        writer = self.writer(User, (
+            'id', 'password', 'is_superuser', 'username', 'first_name',
+            'last_name', 'email', 'is_staff', 'is_active', 'date_joined',
+            'followers_count'))
+        for user_id in ids:
+            writer.add(user_id, password, False, f'fake{user_id}', 'Имя',
+                       f'Фамилия{user_id}', f'fake{user_id}@example.com',
+                       False, True, now, 0)
+        self.log(User, writer.close())
+        return list(ids)
+
+    def generate_recipes(self, author_ids):
+        recipe_id = self.next_id(Recipe)
+        first_id = recipe_id
+        now = timezone.now()
+        writer = self.writer(Recipe, (
+            'id', 'name', 'author_id', 'image', 'text', 'cooking_time',
+            'pub_date', 'image_variants', 'favorites_count'))
+        for author_id in author_ids:
+            for _ in range(self.count(self.options['recipes_per_author'])):
+                writer.add(recipe_id, f'Рецепт {recipe_id}', author_id,
+                           FAKE_IMAGE, f'Описание рецепта {recipe_id}',
+                           self.rng.randint(1, 180),
+                           now - timedelta(seconds=self.rng.randint(
+                               0, PUBLICATION_PERIOD)), {}, 0)
+                recipe_id += 1
+        self.log(Recipe, writer.close())
+        return list(range(first_id, recipe_id))
+
+    def generate_recipe_relations(self, recipe_ids, ingredient_ids, tag_ids):
+        ingredients = self.writer(
+            IngredientInRecipe, ('recipe_id', 'ingredient_id', 'amount'))
+        tags = self.writer(Recipe.tags.through, ('recipe_id', 'tag_id'))
+        min_ingredients, max_ingredients = (
+            self.options['ingredients_per_recipe'])
+        min_tags, max_tags = self.options['tags_per_recipe']
+        for recipe_id in recipe_ids:
+            for ingredient_id in self.rng.sample(ingredient_ids, min(
+                    len(ingredient_ids),
+                    self.rng.randint(min_ingredients, max_ingredients))):
+                ingredients.add(
+                    recipe_id, ingredient_id, self.rng.randint(1, 500))
+            for tag_id in self.rng.sample(tag_ids, min(
+                    len(tag_ids), self.rng.randint(min_tags, max_tags))):
+                tags.add(recipe_id, tag_id)
+        self.log(IngredientInRecipe, ingredients.close())
+        self.log(Recipe.tags.through, tags.close())
+
+    def generate_follows(self, user_ids, author_ids):
+        writer = self.writer(Follow, ('user_id', 'author_id'))
+        cum_weights = self.popularity(len(author_ids))
+        for user_id in user_ids:
+            authors = self.choose(author_ids, cum_weights, self.count(
+                self.options['follows_per_user']))
+            authors.discard(user_id)
+            for author_id in sorted(authors):
+                writer.add(user_id, author_id)
+        self.log(Follow, writer.close())
+
+    def generate_user_recipes(self, model, user_ids, recipe_ids, mean):
+        writer = self.writer(model, ('user_id', 'recipe_id'))
+        if recipe_ids:
+            cum_weights = self.popularity(len(recipe_ids))
+            for user_id in user_ids:
+                for recipe_id in sorted(self.choose(
+                        recipe_ids, cum_weights, self.count(mean))):
+                    writer.add(user_id, recipe_id)
+        self.log(model, writer.close())
+
+    def reset_sequences(self):
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Recipe])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
@@ -1,43 +1,15 @@
-import csv
-import logging
-import os
-
-from django.conf import settings
-from django.core.management.base import BaseCommand, CommandError
-
+from recipes.management.base import BulkLoadCommand
 from recipes.models import Ingredient
+from recipes.search import ingredient_index
 
-logging.basicConfig(
-    level=logging.INFO,
-    filename='main.log',
-    format='%(asctime)s, %(levelname)s, %(name)s, %(message)s',
-    filemode='w',
-)
-
-DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
-
-
-class Command(BaseCommand):
-    help = 'Load data from csv file into the database'
 
-    def add_arguments(self, parser):
-        parser.add_argument('filename', default='ingredients.csv', nargs='?',
-                            type=str)
+class Command(BulkLoadCommand):
+    model = Ingredient
+    filename = 'ingredients.csv'
+    fields = ('name', 'measurement_unit')
+    key = 'name'
+    recipe_lookup = 'ingredient_in_recipe__ingredient'
 
-    def handle(self, *args, **options):
-        try:
-            with open(
-                os.path.join(DATA_ROOT, options['filename']),
-                newline='',
-                encoding='utf8'
-            ) as csv_file:
-                data = csv.reader(csv_file)
-                for row in data:
-                    name, measurement_unit = row
-                    Ingredient.objects.get_or_create(
-                        name=name,
-                        measurement_unit=measurement_unit
-                    )
-        except FileNotFoundError:
-            raise CommandError('Добавьте файл ingredients в директорию data')
-        logging.info('Successfully loaded all data into database')
+    def invalidate(self):
+        super().invalidate()
+        ingredient_index.invalidate()
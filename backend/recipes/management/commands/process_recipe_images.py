@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from recipes import images
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnail and WebP/JPEG variants of recipe images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Regenerate variants that already exist')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        processed = failed = 0
+        for recipe_id, name in list(recipes.values_list('id', 'image')):
+            if images.process(recipe_id, name):
+                processed += 1
+            else:
+                failed += 1
+        self.stdout.write(
+            f'Обработано изображений: {processed}, с ошибками: {failed}')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import FeedEntry
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the followed-authors recipe feeds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, nargs='*', dest='users',
+                            help='Only these user ids')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            FeedEntry.objects.rebuild(
+                options['users'] or None, batch_size=options['batch_size'])
+        self.stdout.write('Ленты подписок пересобраны')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes import fulltext
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text index of recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fulltext.rebuild_index(
+                Recipe.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write('Поисковый индекс рецептов пересобран')
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify the materialized shopping lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, nargs='*', dest='users',
+                            help='Only these user ids')
+        parser.add_argument('--verify', action='store_true',
+                            help='Report drift without changing anything')
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        user_ids = options['users'] or None
+        if options['verify']:
+            drift = self.verify(user_ids)
+            if drift:
+                raise CommandError(
+                    f'Расхождений в списках покупок: {drift}')
+            self.stdout.write('Списки покупок актуальны')
+            return
+        with transaction.atomic():
+            ShoppingListItem.objects.rebuild(
+                user_ids, batch_size=options['batch_size'])
+        self.stdout.write('Списки покупок пересобраны')
+
+    def verify(self, user_ids):
+        expected = {
+            (row['user'], row['ingredient']): row['amount']
+            for row in ShoppingListItem.objects.expected(user_ids).iterator()
+        }
+        items = ShoppingListItem.objects.all()
+        if user_ids is not None:
+            items = items.filter(user__in=user_ids)
+        drift = 0
+        for user, ingredient, amount in items.values_list(
+                'user', 'ingredient', 'amount').iterator():
+            if expected.pop((user, ingredient), None) != amount:
+                drift += 1
+                self.stdout.write(
+                    f'user={user} ingredient={ingredient}: {amount}')
+        for (user, ingredient), amount in expected.items():
+            drift += 1
+            self.stdout.write(
+                f'user={user} ingredient={ingredient}: нет строки, '
+                f'ожидалось {amount}')
+        return drift
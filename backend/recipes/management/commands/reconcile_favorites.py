@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from recipes.models import FavoriteCounter, Recipe
+
+
+class Command(BaseCommand):
+    help = ('Fold pending favorite counter shards into Recipe.favorites_count '
+            'or recount them from the favorites table')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipe', type=int, nargs='*', dest='recipes',
+                            help='Only these recipe ids')
+        parser.add_argument('--recount', action='store_true',
+                            help='Recount from the favorites table')
+        parser.add_argument('--verify', action='store_true',
+                            help='Report drift without changing anything')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        recipe_ids = options['recipes'] or None
+        if options['verify']:
+            drift = self.verify(recipe_ids)
+            if drift:
+                raise CommandError(
+                    f'Расхождений в счётчиках избранного: {drift}')
+            self.stdout.write('Счётчики избранного актуальны')
+        elif options['recount']:
+            FavoriteCounter.objects.reconcile(
+                recipe_ids, batch_size=options['batch_size'])
+            self.stdout.write('Счётчики избранного пересчитаны')
+        else:
+            folded = FavoriteCounter.objects.flush(
+                batch_size=options['batch_size'])
+            self.stdout.write(f'Обновлено рецептов: {folded}')
+
+    def verify(self, recipe_ids):
+        recipes = Recipe.objects.order_by().annotate(
+            actual=Count('favorite'))
+        if recipe_ids is not None:
+            recipes = recipes.filter(pk__in=recipe_ids)
+        pending = FavoriteCounter.objects.pending(recipe_ids)
+        drift = 0
+        for pk, count, actual in recipes.values_list(
+                'pk', 'favorites_count', 'actual').iterator():
+            expected = count + pending.get(pk, 0)
+            if expected != actual:
+                drift += 1
+                self.stdout.write(
+                    f'recipe={pk}: {expected}, ожидалось {actual}')
+        return drift
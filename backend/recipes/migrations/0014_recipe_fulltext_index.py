@@ -0,0 +1,25 @@
+from django.db import migrations
+
+from recipes import fulltext
+
+
+def create_index(apps, schema_editor):
+    fulltext.create_index(schema_editor)
+    if schema_editor.connection.vendor == 'sqlite':
+        fulltext.rebuild_index(
+            apps.get_model('recipes', 'Recipe').objects.all())
+
+
+def drop_index(apps, schema_editor):
+    fulltext.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.16 on 2026-10-18 07:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_favorites(apps, schema_editor):
+    Favorite = apps.get_model('recipes', 'Favorite')
+    apps.get_model('recipes', 'Recipe').objects.update(
+        favorites_count=Coalesce(Subquery(
+            Favorite.objects.filter(recipe=OuterRef('pk')).order_by()
+            .values('recipe').annotate(count=Count('pk')).values('count')
+        ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0018_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FavoriteCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField(verbose_name='Шард')),
+                ('delta', models.IntegerField(default=0, verbose_name='Изменение')),
+            ],
+            options={
+                'verbose_name': 'Счётчик избранного',
+                'verbose_name_plural': 'Счётчики избранного',
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество избранного'),
+        ),
+        migrations.RunPython(count_favorites, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-pub_date', '-id'], name='recipe_popularity_idx'),
+        ),
+        migrations.AddField(
+            model_name='favoritecounter',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favorite_counters', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AddConstraint(
+            model_name='favoritecounter',
+            constraint=models.UniqueConstraint(fields=('recipe', 'shard'), name='unique_favorite_counter'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 07:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0019_favorites_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(db_index=True, help_text='Загрузите фото блюда', upload_to='recipe/', verbose_name='Фото блюда'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.2.16 on 2026-10-18 07:27
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+from recipes import fulltext
+
+
+def drop_unmanaged_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'DROP TABLE IF EXISTS {fulltext.POSTGRESQL_TABLE}')
+
+
+def create_document_index(apps, schema_editor):
+    fulltext.create_document_index(schema_editor)
+    if schema_editor.connection.vendor == 'postgresql':
+        fulltext.rebuild_index(
+            apps.get_model('recipes', 'Recipe').objects.all())
+
+
+def drop_document_index(apps, schema_editor):
+    fulltext.drop_document_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0020_recipe_image_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_unmanaged_table, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='RecipeSearch',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('document', django.contrib.postgres.search.SearchVectorField(verbose_name='Поисковый документ')),
+            ],
+            options={
+                'verbose_name': 'Поисковый документ рецепта',
+                'verbose_name_plural': 'Поисковые документы рецептов',
+                'db_table': 'recipes_recipe_search',
+            },
+        ),
+        migrations.RunPython(create_document_index, drop_document_index),
+    ]
@@ -1,9 +1,54 @@
-from django.db import models
+import logging
+import random
+import threading
+from collections import defaultdict
+from itertools import islice
+
+from django.db import connections, models, transaction
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from django.core.cache import cache
 from django.core.validators import MinValueValidator
+from django.db.models import (Case, Count, Exists, F, OuterRef, Prefetch,
+                              Subquery, Sum, Value, When, Window)
+from django.db.models.functions import Coalesce, RowNumber
 from django.template.defaultfilters import slugify
+from django.utils import timezone
+
+from users.models import Follow, User
+
+logger = logging.getLogger(__name__)
+
+
+class ReferenceDataVersionQuerySet(models.QuerySet):
+    def bump(self, name):
+        if not self.filter(name=name).update(version=F('version') + 1):
+            self.get_or_create(name=name, defaults={'version': 1})
+
+    def get_version(self, name):
+        return self.filter(name=name).values_list(
+            'version', flat=True).first() or 0
+
+
+class ReferenceDataVersion(models.Model):
+    name = models.CharField(
+        'Справочник',
+        unique=True,
+        max_length=settings.MAX_LENGTH_1
+    )
+    version = models.PositiveBigIntegerField(
+        'Версия',
+        default=0
+    )
+
+    objects = ReferenceDataVersionQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Версия справочника'
+        verbose_name_plural = 'Версии справочников'
 
-from users.models import User
+    def __str__(self):
+        return f'{self.name}: {self.version}'
 
 
 class Ingredient(models.Model):
@@ -65,6 +110,67 @@ class Tag(models.Model):
         return super().save(*args, **kwargs)
 
 
+def reading_prefetches(user):
+    if user.is_authenticated:
+        is_subscribed = Exists(Follow.objects.filter(
+            user=user, author=OuterRef('pk')))
+    else:
+        is_subscribed = Value(False, models.BooleanField())
+    return (
+        Prefetch('author', queryset=User.objects.annotate(
+            is_subscribed=is_subscribed)),
+        'tags',
+        Prefetch('ingredient_in_recipe',
+                 queryset=IngredientInRecipe.objects.select_related(
+                     'ingredient')),
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+    def with_user_flags(self, user):
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False, models.BooleanField()),
+                is_in_shopping_cart=Value(False, models.BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+    def with_author_subscription(self, user):
+        if not user.is_authenticated:
+            return self.annotate(
+                author_is_subscribed=Value(False, models.BooleanField()))
+        return self.annotate(author_is_subscribed=Exists(
+            Follow.objects.filter(user=user, author=OuterRef('author'))))
+
+    def for_reading(self, user):
+        return self.with_user_flags(user).prefetch_related(
+            *reading_prefetches(user))
+
+    def first_per_author(self, author_ids, limit=None):
+        recipes = self.filter(author__in=author_ids)
+        if limit is None or not author_ids:
+            return recipes
+        ordering = [
+            F(field[1:]).desc() if field.startswith('-') else F(field).asc()
+            for field in (*self.model._meta.ordering, 'pk')
+        ]
+        sql, params = recipes.order_by().annotate(
+            author_recipe_number=Window(
+                RowNumber(), partition_by=F('author'), order_by=ordering)
+        ).query.sql_with_params()
+        return self.raw(
+            f'SELECT * FROM ({sql}) ranked '
+            'WHERE author_recipe_number <= %s '
+            'ORDER BY author_recipe_number',
+            (*params, limit),
+        )
+
+
 class Recipe(models.Model):
     name = models.CharField(
         'Название рецепта',
@@ -80,6 +186,7 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Фото блюда',
         upload_to='recipe/',
+        db_index=True,
         help_text='Загрузите фото блюда'
     )
     ingredients = models.ManyToManyField(
@@ -102,9 +209,35 @@ class Recipe(models.Model):
         'Время приготовления',
         validators=[MinValueValidator(settings.MIN_VALUE)]
     )
+    image_variants = models.JSONField(
+        'Варианты фото',
+        default=dict,
+        blank=True,
+        editable=False
+    )
+    pub_date = models.DateTimeField(
+        'Дата публикации',
+        default=timezone.now,
+        editable=False
+    )
+    favorites_count = models.PositiveIntegerField(
+        'Количество избранного',
+        default=0,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ('name',)
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=('author', '-pub_date', '-id'),
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=('-favorites_count', '-pub_date', '-id'),
+                         name='recipe_popularity_idx'),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -112,6 +245,25 @@ class Recipe(models.Model):
         return self.name
 
 
+class RecipeSearch(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document',
+        verbose_name='Рецепт'
+    )
+    document = SearchVectorField('Поисковый документ')
+
+    class Meta:
+        db_table = 'recipes_recipe_search'
+        verbose_name = 'Поисковый документ рецепта'
+        verbose_name_plural = 'Поисковые документы рецептов'
+
+    def __str__(self):
+        return str(self.recipe_id)
+
+
 class IngredientInRecipe(models.Model):
     recipe = models.ForeignKey(
         Recipe,
@@ -183,3 +335,317 @@ class ShoppingCart(FavoriteShopping):
         default_related_name = 'shopping_cart'
         verbose_name = 'Покупки'
         verbose_name_plural = 'Покупки'
+
+
+def fold_favorites(recipe_id):
+    try:
+        FavoriteCounter.objects.fold([recipe_id])
+    except Exception:
+        logger.exception('Не удалось обновить счётчик избранного %s',
+                         recipe_id)
+    finally:
+        connections.close_all()
+
+
+def fold_favorites_later(recipe_id):
+    timer = threading.Timer(settings.FAVORITES_FOLD_INTERVAL,
+                            fold_favorites, [recipe_id])
+    timer.daemon = True
+    timer.start()
+
+
+class FavoriteCounterQuerySet(models.QuerySet):
+    def add(self, recipe_id, delta):
+        shard = random.randrange(settings.FAVORITES_COUNT_SHARDS)
+        counters = self.filter(recipe=recipe_id, shard=shard)
+        while not counters.update(delta=F('delta') + delta):
+            self.bulk_create(
+                [FavoriteCounter(recipe_id=recipe_id, shard=shard)],
+                ignore_conflicts=True)
+        if not settings.FAVORITES_FOLD_INTERVAL:
+            transaction.on_commit(lambda: self.fold([recipe_id]))
+        elif cache.add(f'recipes:favorites:fold:{recipe_id}', 1,
+                       settings.FAVORITES_FOLD_INTERVAL):
+            transaction.on_commit(lambda: fold_favorites_later(recipe_id))
+
+    def pending(self, recipe_ids=None):
+        counters = self.all() if recipe_ids is None else self.filter(
+            recipe__in=recipe_ids)
+        return dict(counters.order_by().values('recipe').annotate(
+            total=Sum('delta')).values_list('recipe', 'total'))
+
+    @transaction.atomic
+    def fold(self, recipe_ids):
+        recipe_ids = list(Recipe.objects.filter(
+            pk__in=recipe_ids).select_for_update(
+                skip_locked=True).values_list('pk', flat=True))
+        if not recipe_ids:
+            return 0
+        counters = list(self.filter(
+            recipe__in=recipe_ids
+        ).exclude(delta=0).select_for_update().values_list(
+            'pk', 'recipe', 'delta'))
+        deltas = defaultdict(int)
+        for _, recipe_id, delta in counters:
+            deltas[recipe_id] += delta
+        Recipe.objects.filter(pk__in=deltas).update(
+            favorites_count=F('favorites_count') + Case(
+                *(When(pk=pk, then=Value(delta))
+                  for pk, delta in deltas.items()),
+                default=Value(0),
+            ))
+        self.filter(pk__in=[pk for pk, _, _ in counters]).update(
+            delta=F('delta') - Case(
+                *(When(pk=pk, then=Value(delta))
+                  for pk, _, delta in counters),
+                default=Value(0),
+            ))
+        return len(deltas)
+
+    def flush(self, batch_size=1000):
+        self.filter(delta=0).delete()
+        recipe_ids = list(self.order_by().values_list(
+            'recipe', flat=True).distinct())
+        return sum(
+            self.fold(recipe_ids[start:start + batch_size])
+            for start in range(0, len(recipe_ids), batch_size))
+
+    def reconcile(self, recipe_ids=None, batch_size=1000):
+        recipes = Recipe.objects.order_by('pk')
+        if recipe_ids is not None:
+            recipes = recipes.filter(pk__in=recipe_ids)
+        recipe_ids = recipes.values_list('pk', flat=True).iterator(
+            chunk_size=batch_size)
+        for chunk in iter(lambda: list(islice(recipe_ids, batch_size)), []):
+            with transaction.atomic():
+                self.filter(recipe__in=chunk).delete()
+                Recipe.objects.filter(pk__in=chunk).update(
+                    favorites_count=Coalesce(Subquery(
+                        Favorite.objects.filter(recipe=OuterRef('pk'))
+                        .order_by().values('recipe')
+                        .annotate(count=Count('pk')).values('count')
+                    ), 0))
+
+
+class FavoriteCounter(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='favorite_counters',
+        verbose_name='Рецепт'
+    )
+    shard = models.PositiveSmallIntegerField('Шард')
+    delta = models.IntegerField('Изменение', default=0)
+
+    objects = FavoriteCounterQuerySet.as_manager()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['recipe', 'shard'],
+            name='unique_favorite_counter')
+        ]
+        verbose_name = 'Счётчик избранного'
+        verbose_name_plural = 'Счётчики избранного'
+
+    def __str__(self):
+        return f'{self.recipe_id}/{self.shard}: {self.delta:+d}'
+
+
+class ShoppingListItemQuerySet(models.QuerySet):
+    def refresh(self, user_ids, ingredient_ids=None):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        User.objects.filter(id__in=user_ids).update(
+            shopping_list_modified=timezone.now())
+        items = self.filter(user__in=user_ids)
+        if ingredient_ids is not None:
+            ingredient_ids = list(ingredient_ids)
+            items = items.filter(ingredient__in=ingredient_ids)
+        items.delete()
+        self.bulk_create(
+            ShoppingListItem(user_id=row['user'],
+                             ingredient_id=row['ingredient'],
+                             amount=row['amount'])
+            for row in self.expected(user_ids, ingredient_ids))
+
+    def refresh_recipe(self, recipe_id, ingredient_ids):
+        self.refresh(ShoppingCart.objects.filter(
+            recipe=recipe_id).values_list('user', flat=True), ingredient_ids)
+
+    def expected(self, user_ids=None, ingredient_ids=None):
+        lookups = {'recipe__ingredient_in_recipe__isnull': False}
+        if ingredient_ids is not None:
+            lookups['recipe__ingredient_in_recipe__ingredient__in'] = (
+                ingredient_ids)
+        carts = ShoppingCart.objects.filter(**lookups)
+        if user_ids is not None:
+            carts = carts.filter(user__in=user_ids)
+        return carts.order_by().values(
+            'user', ingredient=F('recipe__ingredient_in_recipe__ingredient')
+        ).annotate(amount=Sum('recipe__ingredient_in_recipe__amount'))
+
+    def rebuild(self, user_ids=None, batch_size=10000):
+        users = User.objects.all() if user_ids is None else (
+            User.objects.filter(id__in=user_ids))
+        users.update(shopping_list_modified=timezone.now())
+        items = self.all() if user_ids is None else self.filter(
+            user__in=user_ids)
+        items.delete()
+        batch = []
+        for row in self.expected(user_ids).iterator(chunk_size=batch_size):
+            batch.append(ShoppingListItem(
+                user_id=row['user'], ingredient_id=row['ingredient'],
+                amount=row['amount']))
+            if len(batch) >= batch_size:
+                self.bulk_create(batch)
+                batch = []
+        self.bulk_create(batch)
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(
+        'Количество',
+    )
+
+    objects = ShoppingListItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'ingredient'],
+            name='unique_shopping_list_item')
+        ]
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Список покупок'
+
+    def __str__(self):
+        return (f'{self.user.username}: {self.ingredient.name} - '
+                f'{self.amount} {self.ingredient.measurement_unit}')
+
+
+def count_followers(author_ids=None):
+    authors = User.objects.all() if author_ids is None else (
+        User.objects.filter(pk__in=author_ids))
+    authors.update(followers_count=Coalesce(Subquery(
+        Follow.objects.filter(author=OuterRef('pk')).order_by().values(
+            'author').annotate(count=Count('pk')).values('count')
+    ), 0))
+
+
+def fan_out_on_read(author_ids):
+    return list(User.objects.filter(
+        pk__in=author_ids, followers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).values_list('pk', flat=True))
+
+
+class FeedEntryQuerySet(models.QuerySet):
+    def add(self, user_ids, recipes):
+        self.bulk_create(
+            [FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                       author_id=author_id, pub_date=pub_date)
+             for user_id in user_ids
+             for recipe_id, author_id, pub_date in recipes],
+            ignore_conflicts=True,
+        )
+
+    def fan_out(self, recipe, batch_size=1000):
+        if fan_out_on_read([recipe.author_id]):
+            return
+        followers = recipe.author.following.values_list(
+            'user', flat=True).iterator(chunk_size=batch_size)
+        for user_ids in iter(
+            lambda: list(islice(followers, batch_size)), []
+        ):
+            self.add(user_ids,
+                     [(recipe.id, recipe.author_id, recipe.pub_date)])
+
+    def backfill(self, user_id, author_id):
+        if fan_out_on_read([author_id]):
+            return
+        self.add([user_id], Recipe.objects.filter(
+            author=author_id).values_list('id', 'author', 'pub_date')[
+                :settings.FEED_BACKFILL])
+
+    def prune(self, user_id, author_id):
+        self.filter(user=user_id, author=author_id).delete()
+
+    def rebuild(self, user_ids=None, batch_size=1000):
+        entries = self.all() if user_ids is None else self.filter(
+            user__in=user_ids)
+        entries.delete()
+        follows = Follow.objects.all() if user_ids is None else (
+            Follow.objects.filter(user__in=user_ids))
+        count_followers(None if user_ids is None else follows.values(
+            'author'))
+        follows = follows.values_list('user', 'author').iterator(
+            chunk_size=batch_size)
+        for chunk in iter(lambda: list(islice(follows, batch_size)), []):
+            authors = {author_id for _, author_id in chunk}
+            authors.difference_update(fan_out_on_read(authors))
+            recipes = defaultdict(list)
+            for recipe in Recipe.objects.first_per_author(
+                    list(authors), settings.FEED_BACKFILL):
+                recipes[recipe.author_id].append(
+                    (recipe.id, recipe.author_id, recipe.pub_date))
+            self.bulk_create(
+                [FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                           author_id=author_id, pub_date=pub_date)
+                 for user_id, author in chunk
+                 for recipe_id, author_id, pub_date in recipes[author]],
+                batch_size=batch_size, ignore_conflicts=True,
+            )
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта'
+    )
+    pub_date = models.DateTimeField(
+        'Дата публикации',
+    )
+
+    objects = FeedEntryQuerySet.as_manager()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'recipe'],
+            name='unique_feed_entry')
+        ]
+        indexes = [
+            models.Index(fields=('user', '-pub_date', '-recipe'),
+                         name='feed_user_pub_date_idx'),
+            models.Index(fields=('user', 'author'),
+                         name='feed_user_author_idx'),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+
+    def __str__(self):
+        return f'{self.user.username}: {self.recipe.name}'
@@ -0,0 +1,125 @@
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count
+
+from .models import Ingredient
+
+logger = logging.getLogger(__name__)
+
+IndexedIngredient = namedtuple(
+    'IndexedIngredient', ('key', 'usage', 'id', 'name', 'measurement_unit'))
+Snapshot = namedtuple('Snapshot', ('keys', 'entries', 'trigrams', 'sizes'))
+
+
+def normalize(value):
+    return value.casefold().replace('ё', 'е')
+
+
+def trigrams(value):
+    result = set()
+    for word in ''.join(
+        char if char.isalnum() else ' ' for char in normalize(value)
+    ).split():
+        word = f'  {word} '
+        result.update(word[i:i + 3] for i in range(len(word) - 2))
+    return result
+
+
+class IngredientIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.expires = 0
+
+    def build(self):
+        entries = sorted(
+            IndexedIngredient(normalize(name), usage, pk, name, unit)
+            for pk, name, unit, usage in Ingredient.objects.annotate(
+                usage=Count('ingredients_list')
+            ).order_by().values_list('id', 'name', 'measurement_unit', 'usage')
+        )
+        postings = defaultdict(list)
+        sizes = []
+        for position, entry in enumerate(entries):
+            entry_trigrams = trigrams(entry.name)
+            sizes.append(len(entry_trigrams))
+            for trigram in entry_trigrams:
+                postings[trigram].append(position)
+        self.snapshot = Snapshot(
+            [entry.key for entry in entries], entries, dict(postings), sizes)
+        self.expires = time.monotonic() + settings.INGREDIENT_INDEX_TTL
+
+    def refresh(self):
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.build()
+        except Exception:
+            logger.exception('Не удалось построить индекс ингредиентов')
+        finally:
+            self.lock.release()
+            connections.close_all()
+
+    def warm_up(self):
+        threading.Thread(target=self.refresh, name='ingredient-index',
+                         daemon=True).start()
+
+    def invalidate(self):
+        self.expires = 0
+
+    def get_snapshot(self):
+        snapshot = self.snapshot
+        if snapshot is None:
+            with self.lock:
+                if self.snapshot is None:
+                    self.build()
+            return self.snapshot
+        if time.monotonic() >= self.expires and not self.lock.locked():
+            self.warm_up()
+        return snapshot
+
+    def autocomplete(self, prefix, limit):
+        keys, entries, _, _ = self.get_snapshot()
+        key = normalize(prefix)
+        start = bisect_left(keys, key)
+        end = bisect_left(keys, key + '\U0010ffff', start)
+        return [
+            self.serialize(entry) for entry in heapq.nsmallest(
+                limit, entries[start:end],
+                key=lambda entry: (-entry.usage, entry.key))
+        ]
+
+    def fuzzy(self, query, limit):
+        _, entries, postings, sizes = self.get_snapshot()
+        query_trigrams = trigrams(query)
+        shared = defaultdict(int)
+        for trigram in query_trigrams:
+            for position in postings.get(trigram, ()):
+                shared[position] += 1
+        threshold = settings.INGREDIENT_FUZZY_THRESHOLD
+        matches = []
+        for position, count in shared.items():
+            similarity = count / (
+                len(query_trigrams) + sizes[position] - count)
+            if similarity >= threshold:
+                entry = entries[position]
+                matches.append((-similarity, -entry.usage, entry.key, entry))
+        return [
+            self.serialize(match[-1])
+            for match in heapq.nsmallest(limit, matches)
+        ]
+
+    @staticmethod
+    def serialize(entry):
+        return {'id': entry.id, 'name': entry.name,
+                'measurement_unit': entry.measurement_unit}
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,153 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from . import fulltext, images
+from api.caching import invalidate_recipe, invalidate_recipes
+from users.models import Follow, User
+
+from .models import (FeedEntry, Ingredient, IngredientInRecipe, Recipe,
+                     ReferenceDataVersion, ShoppingCart, ShoppingListItem, Tag)
+from .search import ingredient_index
+
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+    ReferenceDataVersion.objects.bump(Ingredient._meta.db_table)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(**kwargs):
+    ReferenceDataVersion.objects.bump(Tag._meta.db_table)
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_ingredient_recipes(instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        invalidate_recipes(Recipe.objects.filter(
+            ingredient_in_recipe__ingredient=instance))
+
+
+@receiver((post_save, pre_delete), sender=Tag)
+def invalidate_tag_recipes(instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_recipes(instance.recipe.all())
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(instance, created, update_fields=None,
+                              raw=False, **kwargs):
+    if created or raw or (
+            update_fields is not None
+            and not AUTHOR_FIELDS.intersection(update_fields)):
+        return
+    invalidate_recipes(instance.author.all())
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_saved_recipe(instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_recipe(
+            instance, instance.tags.values_list('slug', flat=True))
+
+
+@receiver(pre_delete, sender=Recipe)
+def invalidate_deleted_recipe(instance, **kwargs):
+    invalidate_recipe(instance, instance.tags.values_list('slug', flat=True))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        invalidate_recipes(instance.recipe.all() if action == 'pre_clear'
+                           else Recipe.objects.filter(pk__in=pk_set))
+    elif action == 'pre_clear':
+        invalidate_recipe(
+            instance, instance.tags.values_list('slug', flat=True))
+    else:
+        invalidate_recipe(instance, Tag.objects.filter(
+            pk__in=pk_set).values_list('slug', flat=True))
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def invalidate_recipe_ingredients(instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_recipes(Recipe.objects.filter(pk=instance.recipe_id))
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def refresh_shopping_list(instance, raw=False, **kwargs):
+    if not raw:
+        ShoppingListItem.objects.refresh([instance.user_id])
+
+
+@receiver(pre_save, sender=IngredientInRecipe)
+def remember_recipe_ingredient(instance, raw=False, **kwargs):
+    instance.saved_ingredient_id = None if raw or instance.pk is None else (
+        IngredientInRecipe.objects.filter(pk=instance.pk).values_list(
+            'ingredient', flat=True).first())
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def refresh_recipe_shopping_lists(instance, raw=False, **kwargs):
+    if raw:
+        return
+    ingredient_ids = {instance.ingredient_id}
+    if getattr(instance, 'saved_ingredient_id', None) is not None:
+        ingredient_ids.add(instance.saved_ingredient_id)
+    ShoppingListItem.objects.refresh_recipe(instance.recipe_id, ingredient_ids)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(instance, raw=False, **kwargs):
+    if not raw:
+        fulltext.index_recipes([instance])
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(instance, created, raw=False, **kwargs):
+    if created and not raw:
+        FeedEntry.objects.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follower(instance, created, raw=False, **kwargs):
+    if created and not raw:
+        User.objects.filter(pk=instance.author_id).update(
+            followers_count=F('followers_count') + 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_removed_follower(instance, **kwargs):
+    User.objects.filter(pk=instance.author_id, followers_count__gt=0).update(
+        followers_count=F('followers_count') - 1)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(instance, created, raw=False, **kwargs):
+    if created and not raw:
+        FeedEntry.objects.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed(instance, **kwargs):
+    FeedEntry.objects.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_index(instance, **kwargs):
+    fulltext.remove_recipes([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_unused_recipe_files(instance, **kwargs):
+    names = [instance.image.name, *images.variant_names(
+        instance.image_variants)]
+    transaction.on_commit(lambda: images.delete_unused_files(names))
@@ -0,0 +1,44 @@
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+DIGEST = re.compile(r'[0-9a-f]{64}(\.|$)')
+
+
+def is_content_addressed(name):
+    directory, base = os.path.split(name)
+    return (DIGEST.match(base) is not None
+            and os.path.basename(directory) == base[:2])
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def claim(self, name):
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        if is_content_addressed(name):
+            if self.claim(name):
+                return name.replace('\\', '/')
+            return super().save(name, content, max_length)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        name = os.path.join(
+            os.path.dirname(name), digest[:2], digest + extension)
+        if self.claim(name):
+            return name.replace('\\', '/')
+        return super().save(name, content, max_length)
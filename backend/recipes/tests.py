@@ -0,0 +1,322 @@
+import os
+import io
+import random
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+
+from api.caching import get_versions
+from api.serializers import AddRecipeSerializer
+from users.models import User
+
+from . import fulltext, images
+from .models import (FavoriteCounter, Ingredient, IngredientInRecipe, Recipe,
+                     ShoppingCart, ShoppingListItem, Tag)
+
+SNOWBALL_STEMS = {
+    'курица': 'куриц',
+    'курицы': 'куриц',
+    'куриного': 'курин',
+    'картофель': 'картофел',
+    'картофельный': 'картофельн',
+    'пюре': 'пюр',
+    'запеченная': 'запечен',
+    'жареные': 'жарен',
+    'жарить': 'жар',
+    'сваренный': 'сварен',
+    'молоко': 'молок',
+    'салаты': 'салат',
+    'борщ': 'борщ',
+    'пирожки': 'пирожк',
+    'яблочный': 'яблочн',
+    'вкуснейший': 'вкусн',
+    'быстрейшая': 'быстр',
+    'способность': 'способн',
+    'красивость': 'красив',
+    'печенье': 'печен',
+    'овощами': 'овощ',
+    'приготовление': 'приготовлен',
+    'нарезанный': 'нареза',
+    'обжарившись': 'обжар',
+    'обжаривая': 'обжарив',
+    'взбитые': 'взбит',
+    'сливочное': 'сливочн',
+}
+
+
+class StemTests(SimpleTestCase):
+    def test_matches_postgresql_snowball_stemmer(self):
+        for word, expected in SNOWBALL_STEMS.items():
+            with self.subTest(word=word):
+                self.assertEqual(fulltext.stem(word), expected)
+
+    def test_normalizes_case_and_yo(self):
+        self.assertEqual(fulltext.stem('Свёкла'), 'свекл')
+        self.assertEqual(fulltext.stem('ЗАПЕЧЁННЫЙ'), 'запечен')
+
+    def test_stemmed_splits_words(self):
+        self.assertEqual(
+            fulltext.stemmed('Тушёная говядина, с овощами!'),
+            'тушен говядин с овощ')
+
+    def test_sqlite_query_matches_prefix_of_last_word(self):
+        self.assertEqual(
+            fulltext.sqlite_query('куриный суп с карт'),
+            '"курин" "суп" "с" "карт"*')
+        self.assertIsNone(fulltext.sqlite_query('!!'))
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            username='author', email='author@example.com')
+        cls.soup = Recipe.objects.create(
+            author=author, name='Куриный суп', image='recipe/soup.png',
+            text='Сварить курицу с картофелем, подать с пюре.',
+            cooking_time=60)
+        cls.puree = Recipe.objects.create(
+            author=author, name='Картофельное пюре', image='recipe/puree.png',
+            text='Картофель размять с горячим молоком.', cooking_time=30)
+
+    def search(self, value):
+        return list(fulltext.search(Recipe.objects.all(), value))
+
+    def test_finds_word_forms(self):
+        self.assertEqual(self.search('курица'), [self.soup])
+        self.assertEqual(self.search('молоко'), [self.puree])
+
+    def test_ranks_name_above_text(self):
+        self.assertEqual(self.search('пюре'), [self.puree, self.soup])
+
+    def test_no_matches(self):
+        self.assertEqual(self.search('шоколад'), [])
+
+    def test_follows_recipe_changes(self):
+        self.soup.name = 'Рыбный суп'
+        self.soup.save()
+        self.assertEqual(self.search('рыбного'), [self.soup])
+        self.soup.delete()
+        self.assertEqual(self.search('суп'), [])
+
+
+def create_recipe(name='Куриный суп'):
+    author, _ = User.objects.get_or_create(
+        username='author', defaults={'email': 'author@example.com'})
+    return Recipe.objects.create(
+        author=author, name=name, image='recipe/soup.png', text=name,
+        cooking_time=10)
+
+
+class FavoriteCounterTests(TestCase):
+    def setUp(self):
+        self.recipe = create_recipe()
+
+    def favorites_count(self):
+        self.recipe.refresh_from_db()
+        return self.recipe.favorites_count
+
+    @override_settings(FAVORITES_COUNT_SHARDS=1)
+    def test_add_after_zero_shard_is_dropped(self):
+        FavoriteCounter.objects.add(self.recipe.pk, 1)
+        FavoriteCounter.objects.fold([self.recipe.pk])
+        FavoriteCounter.objects.flush()
+        self.assertFalse(FavoriteCounter.objects.exists())
+        FavoriteCounter.objects.add(self.recipe.pk, 1)
+        FavoriteCounter.objects.fold([self.recipe.pk])
+        self.assertEqual(self.favorites_count(), 2)
+
+    def test_interleaved_add_and_fold_are_exact(self):
+        rng = random.Random(25)
+        total = 0
+        for step in range(200):
+            delta = 1 if total == 0 else rng.choice((1, 1, -1))
+            FavoriteCounter.objects.add(self.recipe.pk, delta)
+            total += delta
+            if step % 7 == 0:
+                FavoriteCounter.objects.fold([self.recipe.pk])
+            if step % 31 == 0:
+                FavoriteCounter.objects.flush()
+            self.assertEqual(
+                self.favorites_count() + FavoriteCounter.objects.pending(
+                    [self.recipe.pk]).get(self.recipe.pk, 0),
+                total)
+        FavoriteCounter.objects.flush()
+        self.assertEqual(self.favorites_count(), total)
+        self.assertFalse(
+            FavoriteCounter.objects.exclude(delta=0).exists())
+
+
+class ShoppingListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='buyer', email='buyer@example.com')
+        cls.salt, cls.potato, cls.milk = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('соль', 'картофель', 'молоко'))
+        cls.soup = create_recipe('Куриный суп')
+        cls.puree = create_recipe('Картофельное пюре')
+        IngredientInRecipe.objects.bulk_create([
+            IngredientInRecipe(recipe=cls.soup, ingredient=cls.salt,
+                               amount=5),
+            IngredientInRecipe(recipe=cls.soup, ingredient=cls.potato,
+                               amount=300),
+            IngredientInRecipe(recipe=cls.puree, ingredient=cls.potato,
+                               amount=500),
+            IngredientInRecipe(recipe=cls.puree, ingredient=cls.milk,
+                               amount=200),
+        ])
+
+    def setUp(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.soup)
+        ShoppingCart.objects.create(user=self.user, recipe=self.puree)
+
+    def assert_shopping_list(self, expected):
+        items = set(ShoppingListItem.objects.filter(
+            user=self.user).values_list('ingredient', 'amount'))
+        self.assertEqual(items, {
+            (row['ingredient'], row['amount'])
+            for row in ShoppingListItem.objects.expected([self.user.id])})
+        self.assertEqual(items, expected)
+
+    def test_add_recipe(self):
+        self.assert_shopping_list({
+            (self.salt.id, 5), (self.potato.id, 800), (self.milk.id, 200)})
+
+    def test_remove_recipe(self):
+        ShoppingCart.objects.filter(
+            user=self.user, recipe=self.puree).delete()
+        self.assert_shopping_list({
+            (self.salt.id, 5), (self.potato.id, 300)})
+
+    def test_edit_ingredients(self):
+        row = IngredientInRecipe.objects.get(
+            recipe=self.soup, ingredient=self.potato)
+        row.amount = 400
+        row.save()
+        self.assert_shopping_list({
+            (self.salt.id, 5), (self.potato.id, 900), (self.milk.id, 200)})
+        row.ingredient = self.milk
+        row.save()
+        self.assert_shopping_list({
+            (self.salt.id, 5), (self.potato.id, 500), (self.milk.id, 600)})
+        IngredientInRecipe.objects.filter(
+            recipe=self.puree, ingredient=self.milk).delete()
+        self.assert_shopping_list({
+            (self.salt.id, 5), (self.potato.id, 500), (self.milk.id, 400)})
+
+    def test_update_ingredients_by_diff(self):
+        AddRecipeSerializer.update_ingredients(self.soup, [
+            {'id': self.potato, 'amount': 100},
+            {'id': self.milk, 'amount': 50},
+        ])
+        self.assert_shopping_list({
+            (self.potato.id, 600), (self.milk.id, 250)})
+
+    def test_delete_recipe(self):
+        self.puree.delete()
+        self.assert_shopping_list({
+            (self.salt.id, 5), (self.potato.id, 300)})
+        self.soup.delete()
+        self.assert_shopping_list(set())
+
+
+class BulkLoadTests(TestCase):
+    def setUp(self):
+        self.salt = Ingredient.objects.create(
+            name='соль', measurement_unit='г')
+        self.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast')
+        self.recipe = create_recipe()
+        self.recipe.tags.add(self.tag)
+        IngredientInRecipe.objects.create(
+            recipe=self.recipe, ingredient=self.salt, amount=5)
+
+    def load(self, command, rows):
+        with mock.patch('sys.stdin', io.StringIO(rows)):
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command(command, '-', stdout=io.StringIO())
+
+    def recipe_version(self):
+        return get_versions([f'recipe:{self.recipe.pk}'])[0]
+
+    def test_changed_tag_invalidates_recipes(self):
+        version = self.recipe_version()
+        self.load('load_tags', 'Завтрак,#E26C2D,breakfast\n')
+        self.assertEqual(self.recipe_version(), version)
+        self.load('load_tags', 'Завтрак,#000000,breakfast\n')
+        self.assertNotEqual(self.recipe_version(), version)
+
+    def test_changed_ingredient_invalidates_recipes(self):
+        version = self.recipe_version()
+        self.load('load_ingredients', 'перец,г\n')
+        self.assertEqual(self.recipe_version(), version)
+        self.load('load_ingredients', 'соль,щепотка\n')
+        self.assertNotEqual(self.recipe_version(), version)
+
+
+@override_settings(RECIPE_FILE_GRACE=60)
+class UnusedFileTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.name = default_storage.save(
+            'recipe/soup.png', ContentFile(b'soup'))
+        modified = time.time() - 120
+        os.utime(default_storage.path(self.name), (modified, modified))
+
+    def test_deletes_unused_file_after_grace(self):
+        self.assertEqual(images.delete_unused_files([self.name]), 1)
+        self.assertFalse(default_storage.exists(self.name))
+
+    def test_keeps_referenced_file(self):
+        recipe = create_recipe()
+        Recipe.objects.filter(pk=recipe.pk).update(image=self.name)
+        self.assertEqual(images.delete_unused_files([self.name]), 0)
+        self.assertTrue(default_storage.exists(self.name))
+
+    def test_keeps_file_claimed_by_uncommitted_save(self):
+        self.assertEqual(default_storage.save(
+            'recipe/puree.png', ContentFile(b'soup')), self.name)
+        self.assertEqual(images.delete_unused_files([self.name]), 0)
+        self.assertTrue(default_storage.exists(self.name))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'нужны блокировки строк')
+@override_settings(FAVORITES_FOLD_INTERVAL=0, FAVORITES_COUNT_SHARDS=2)
+class ConcurrentFavoriteCounterTests(TransactionTestCase):
+    def test_concurrent_add_and_fold_are_exact(self):
+        recipe = create_recipe()
+        start = threading.Barrier(8)
+
+        def favorite():
+            try:
+                start.wait()
+                for _ in range(25):
+                    with transaction.atomic():
+                        FavoriteCounter.objects.add(recipe.pk, 1)
+                    FavoriteCounter.objects.flush()
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=favorite) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        FavoriteCounter.objects.flush()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 200)
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_alter_follow_author'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='shopping_list_modified',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Изменение списка покупок'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.16 on 2026-10-18 07:56
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_followers(apps, schema_editor):
+    Follow = apps.get_model('users', 'Follow')
+    apps.get_model('users', 'User').objects.update(
+        followers_count=Coalesce(Subquery(
+            Follow.objects.filter(author=OuterRef('pk')).order_by().values(
+                'author').annotate(count=Count('pk')).values('count')
+        ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_user_shopping_list_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Подписчики'),
+        ),
+        migrations.RunPython(count_followers, migrations.RunPython.noop),
+    ]
@@ -13,6 +13,17 @@ class User(AbstractUser):
         blank=False,
         help_text='Введите ваш email'
     )
+    shopping_list_modified = models.DateTimeField(
+        'Изменение списка покупок',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Подписчики',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         ordering = ('username',)
@@ -1,11 +1,14 @@
 from django.urls import include, path
+from rest_framework.routers import DefaultRouter
 
-from api.views import FollowView, SubscriptionView
+from api.views import CustomUserViewSet, FollowView, SubscriptionView
 
+router = DefaultRouter()
+router.register('users', CustomUserViewSet)
 
 urlpatterns = [
     path('users/subscriptions/', SubscriptionView.as_view()),
     path('users/<int:pk>/subscribe/', FollowView.as_view()),
-    path('', include('djoser.urls')),
+    path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
 ]